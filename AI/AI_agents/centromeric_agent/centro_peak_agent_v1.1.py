@@ -54,6 +54,7 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import sys
 from pathlib import Path
 from typing import Any
 
@@ -71,6 +72,10 @@ from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph import END, START, StateGraph
 
+# Shared ULTRA loader lives in the repository's bin/ directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "bin"))
+from ultra_io import count_periods  # noqa: E402
+
 
 load_dotenv()
 
@@ -97,6 +102,7 @@ class PeakAgentState(TypedDict, total=False):
     min_prominence_fraction: float
     min_prominence_ratio: float
     top_n: int
+    use_cache: bool
 
     input_summary: dict[str, Any]
     period_distribution: list[dict[str, Any]]
@@ -154,103 +160,6 @@ def to_jsonable(obj: Any) -> Any:
     return obj
 
 
-def normalize_column_name(name: str) -> str:
-    """
-    Normalize ULTRA column names for easier matching.
-
-    Example:
-    '#Subrepeats' becomes 'subrepeats'
-    'Period' becomes 'period'
-    """
-
-    return (
-        str(name)
-        .strip()
-        .lstrip("#")
-        .lower()
-        .replace(" ", "_")
-        .replace("-", "_")
-    )
-
-
-def read_ultra_table(path: str | Path) -> pd.DataFrame:
-    """
-    Read ULTRA output into a pandas DataFrame.
-
-    Only the Period column is required for this first workflow.
-    Other ULTRA columns, such as SeqID, Start, End, Score, Consensus,
-    and Subrepeats, are useful later but are not required here.
-    """
-
-    path = Path(path)
-
-    try:
-        df = pd.read_csv(path, sep="\t", engine="python")
-    except Exception:
-        df = pd.read_csv(path, sep=r"\s+", engine="python")
-
-    if df.shape[1] == 1:
-        df = pd.read_csv(path, sep=r"\s+", engine="python")
-
-    original_columns = list(df.columns)
-    normalized_columns = {col: normalize_column_name(col) for col in original_columns}
-    df = df.rename(columns=normalized_columns)
-
-    # Accept a few common alternative names for the Period column.
-    period_aliases = {
-        "period",
-        "period_bp",
-        "repeat_period",
-        "motif_period",
-        "monomer_size",
-        "monomer_size_bp",
-    }
-
-    detected_period_columns = [col for col in df.columns if col in period_aliases]
-
-    if "period" not in df.columns:
-        if detected_period_columns:
-            df = df.rename(columns={detected_period_columns[0]: "period"})
-        else:
-            raise ValueError(
-                "Could not find a required Period column.\n\n"
-                "For this first workflow, the only required column is Period.\n"
-                "The #Subrepeats column is optional and is not analyzed yet.\n\n"
-                f"Original columns detected: {original_columns}\n"
-                f"Normalized columns detected: {list(df.columns)}"
-            )
-
-    optional_columns = {
-        "seqid",
-        "start",
-        "end",
-        "score",
-        "consensus",
-        "subrepeats",
-    }
-
-    missing_optional_columns = sorted(optional_columns - set(df.columns))
-
-    if missing_optional_columns:
-        print(
-            "Warning: optional columns are missing and will be ignored for now: "
-            + ", ".join(missing_optional_columns)
-        )
-
-    df["period"] = pd.to_numeric(df["period"], errors="coerce")
-    df = df.dropna(subset=["period"]).copy()
-
-    if df.empty:
-        raise ValueError(
-            "The Period column was found, but no valid numeric Period values "
-            "remained after parsing."
-        )
-
-    df["period_int"] = df["period"].round().astype(int)
-
-    return df
-
-
 def local_baseline(
     distribution: pd.DataFrame,
     period: int,
@@ -310,7 +219,7 @@ def group_periods(periods: list[int], group_gap: int) -> list[list[int]]:
 
 
 def analyze_period_peaks(
-    df: pd.DataFrame,
+    df: pd.DataFrame | None,
     min_period: int = 60,
     max_period: int | None = None,
     min_count: int = 10,
@@ -321,6 +230,7 @@ def analyze_period_peaks(
     min_prominence_fraction: float = 0.02,
     min_prominence_ratio: float = 3.0,
     top_n: int = 10,
+    counts: pd.Series | None = None,
 ) -> dict[str, Any]:
     """
     Deterministically identify prominent repeat-period peaks.
@@ -331,12 +241,24 @@ def analyze_period_peaks(
     3. Detect local peaks.
     4. Rank candidate periods by count and local prominence.
     5. Group nearby candidate periods, such as 91 and 92 bp.
+
+    Either pass the table as df (with a period_int column), or pass counts:
+    repeat counts indexed by integer period for the whole table, as returned
+    by ultra_io.count_periods. Counts can be accumulated chunk by chunk, so
+    the table never has to be held in memory.
     """
 
-    filtered = df[df["period_int"] > min_period].copy()
+    if counts is None:
+        counts = df["period_int"].value_counts()
+
+    total_records = int(counts.sum())
+
+    filtered = counts[counts.index > min_period]
 
     if max_period is not None:
-        filtered = filtered[filtered["period_int"] <= max_period].copy()
+        filtered = filtered[filtered.index <= max_period]
+
+    filtered = filtered[filtered > 0]
 
     if filtered.empty:
         raise ValueError(
@@ -344,8 +266,7 @@ def analyze_period_peaks(
         )
 
     counts_by_period = (
-        filtered["period_int"]
-        .value_counts()
+        filtered
         .sort_index()
         .rename_axis("period")
         .reset_index(name="count")
@@ -544,8 +465,8 @@ def analyze_period_peaks(
     )
 
     input_summary = {
-        "total_ultra_records": int(len(df)),
-        "records_after_period_filter": int(len(filtered)),
+        "total_ultra_records": total_records,
+        "records_after_period_filter": int(filtered.sum()),
         "min_period": int(min_period),
         "max_period": None if max_period is None else int(max_period),
         "min_count": int(min_count),
@@ -600,6 +521,7 @@ def validate_input_node(state: PeakAgentState) -> dict[str, Any]:
         ),
         "min_prominence_ratio": float(state.get("min_prominence_ratio", 3.0)),
         "top_n": int(state.get("top_n", 10)),
+        "use_cache": bool(state.get("use_cache", True)),
     }
 
 
@@ -610,10 +532,18 @@ def peak_analysis_node(state: PeakAgentState) -> dict[str, Any]:
     Read the ULTRA table and run deterministic peak analysis.
     """
 
-    df = read_ultra_table(state["ultra_tsv"])
+    # Per-period counts are accumulated chunk by chunk (or read from the
+    # Parquet cache), so memory does not grow with the size of the table.
+    counts = count_periods(state["ultra_tsv"], cache=state.get("use_cache", True))
+
+    if counts.empty:
+        raise ValueError(
+            "No valid numeric Period values were found in the ULTRA table."
+        )
 
     results = analyze_period_peaks(
-        df=df,
+        df=None,
+        counts=counts,
         min_period=state["min_period"],
         max_period=state.get("max_period"),
         min_count=state["min_count"],
@@ -1023,6 +953,15 @@ def parse_args() -> argparse.Namespace:
         help="Number of ranked candidate groups to keep. Default: 10.",
     )
 
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=(
+            "Parse the ULTRA text every time instead of using (or creating) "
+            "the <file>.parquet cache."
+        ),
+    )
+
     return parser.parse_args()
 
 
@@ -1048,6 +987,7 @@ def main() -> None:
         "min_prominence_fraction": args.min_prominence_fraction,
         "min_prominence_ratio": args.min_prominence_ratio,
         "top_n": args.top_n,
+        "use_cache": not args.no_cache,
     }
 
     final_state = app.invoke(initial_state)
@@ -6,7 +6,7 @@ Modular centromeric repeat filtering and visualization.
 
 Features:
 - Prefilter ULTRA TSVs by chromosome/position/period (replaces AWK if desired)
-- Representative sequence selection (auto or manual)
+- Representative sequence selection (auto or manual; k-mer shortlist for large sets)
 - Feature extraction (GC, entropy, indel variability, distance metrics)
 - Alignment scoring vs representative
 - Outlier detection (IsolationForest, LOF)
@@ -43,6 +43,8 @@ from Bio.Align import PairwiseAligner
 from sklearn.ensemble import IsolationForest
 from sklearn.neighbors import LocalOutlierFactor
 
+from ultra_io import ULTRA_COLUMNS, read_ultra
+
 # Optional plotting imports are guarded inside functions so the script works headless.
 
 
@@ -62,13 +64,27 @@ ULTRA_COLS = [
 ]
 
 
-def read_ultra_tsv(path: Path) -> pd.DataFrame:
-    """Read ULTRA-format TSV (no header) into a DataFrame with named columns."""
-    df = pd.read_csv(path, sep="\t", header=None, names=ULTRA_COLS, usecols=range(10))
-    # Basic types
-    for c in ["Start", "Length", "Period", "Score", "Substitutions", "Insertions", "Deletions"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-    return df
+def read_ultra_tsv(
+    path: Path,
+    chrom_substr: Optional[str] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    period: Optional[int] = None,
+    cache: bool = True,
+) -> pd.DataFrame:
+    """
+    Read an ULTRA TSV (either layout, see ultra_io) into a DataFrame with ULTRA_COLS names.
+    The optional prefilter arguments (same meaning as in prefilter_df) are pushed down to
+    the reader, so with the <path>.parquet cache only matching chromosomes/row groups are read.
+    """
+    df = read_ultra(
+        path,
+        chroms=(lambda name: chrom_substr in name) if chrom_substr else None,
+        start=(start, end) if start is not None or end is not None else None,
+        period=(period, period) if period is not None else None,
+        cache=cache,
+    )
+    return df.rename(columns=dict(zip(ULTRA_COLUMNS, ULTRA_COLS)))
 
 
 def write_tsv(df: pd.DataFrame, path: Path) -> None:
@@ -105,22 +121,134 @@ def prefilter_df(
 
 # ----------------------------- Representative ----------------------------- #
 
-def pick_representative_by_similarity(consensus_list: List[str]) -> Tuple[int, str]:
-    """
-    Choose the sequence with highest mean global alignment similarity to all others.
-    Returns (index, representative_seq).
-    """
-    if not consensus_list:
-        raise ValueError("No sequences provided to choose representative.")
+REP_METHODS = ("align", "cosine", "jaccard")
+
 
+def make_aligner() -> PairwiseAligner:
+    """Global aligner scoring identities only (score / max length = fraction identical)."""
     aligner = PairwiseAligner()
     aligner.mode = "global"
     aligner.match_score = 1
     aligner.mismatch_score = 0
     aligner.open_gap_score = 0
     aligner.extend_gap_score = 0
+    return aligner
+
+
+def kmer_profiles(seqs: List[str], k: int = 5):
+    """
+    k-mer count profiles as a sparse (len(seqs) x 4**k) CSR matrix. All sequences are
+    encoded in one pass over their concatenation; k-mers containing a non-ACGT base or
+    crossing into the next sequence are skipped.
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+    from scipy import sparse
+
+    n = len(seqs)
+    lut = np.full(256, 4, dtype=np.int64)
+    for code, base in enumerate(b"ACGT"):
+        lut[base] = lut[base + 32] = code  # upper and lower case
+    lengths = np.fromiter((len(s) for s in seqs), dtype=np.int64, count=n)
+    bases = lut[np.frombuffer("".join(seqs).encode("ascii", "replace"), dtype=np.uint8)]
+    if bases.size < k:
+        return sparse.csr_matrix((n, 4 ** k))
+
+    windows = sliding_window_view(bases, k)
+    kmers = windows @ (4 ** np.arange(k - 1, -1, -1, dtype=np.int64))
+    owner = np.repeat(np.arange(n), lengths)[: len(kmers)]
+    valid = ~(windows == 4).any(axis=1) & (np.arange(len(kmers)) + k <= np.cumsum(lengths)[owner])
+    counts = np.ones(int(valid.sum()))
+    return sparse.csr_matrix((counts, (owner[valid], kmers[valid])), shape=(n, 4 ** k))
+
+
+def mean_kmer_similarity(profiles, method: str = "cosine", block: int = 2048) -> np.ndarray:
+    """
+    Mean similarity of every profile to all the others.
+    - cosine : the all-vs-all sum is one sparse matrix-vector product with the column sum
+               of the L2-normalized profiles, so no n x n matrix is formed.
+    - jaccard: k-mer set overlap |A & B| / |A | B|, from a sparse product of the presence
+               matrix with its transpose, computed in row blocks of `block`.
+    """
+    n = profiles.shape[0]
+    if n < 2:
+        return np.zeros(n)
+    if method == "cosine":
+        norms = np.sqrt(np.asarray(profiles.multiply(profiles).sum(axis=1)).ravel())
+        unit = profiles.multiply(1.0 / np.where(norms > 0, norms, 1.0)[:, np.newaxis]).tocsr()
+        total = unit @ np.asarray(unit.sum(axis=0)).ravel()
+        self_sim = (norms > 0).astype(float)
+    elif method == "jaccard":
+        present = (profiles > 0).astype(np.float64).tocsr()
+        sizes = np.asarray(present.sum(axis=1)).ravel()
+        total = np.empty(n)
+        for lo in range(0, n, block):
+            inter = (present[lo:lo + block] @ present.T).toarray()
+            union = sizes[lo:lo + block, np.newaxis] + sizes[np.newaxis, :] - inter
+            total[lo:lo + block] = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0).sum(axis=1)
+        self_sim = (sizes > 0).astype(float)
+    else:
+        raise ValueError(f"Unknown k-mer similarity {method!r}; use cosine or jaccard.")
+    return (total - self_sim) / (n - 1)
+
+
+_REP_SEQS: dict = {}
+
+
+def _init_rep_worker(seqs: List[str]) -> None:
+    # The sequence list is handed to each worker once, not once per candidate
+    _REP_SEQS["seqs"] = seqs
+
+
+def _mean_alignment(i: int) -> float:
+    """Mean global alignment similarity of sequence i to all sequences (self counted as 0)."""
+    seqs = _REP_SEQS["seqs"]
+    aligner = make_aligner()
+    si = seqs[i]
+    total = 0.0
+    for j, sj in enumerate(seqs):
+        if j != i:
+            total += aligner.score(si, sj) / max(len(si), len(sj))
+    return total / len(seqs)
+
+
+def pick_representative_by_similarity(
+    consensus_list: List[str],
+    method: str = "align",
+    k: int = 5,
+    candidates: int = 20,
+    jobs: int = 1,
+) -> Tuple[int, str]:
+    """
+    Choose the sequence with highest mean global alignment similarity to all others.
+    Returns (index, representative_seq).
+
+    method="align" aligns all n(n-1)/2 pairs. With "cosine" or "jaccard" the sequences
+    are first ranked by mean k-mer profile similarity (see mean_kmer_similarity), and
+    only the top `candidates` are aligned against everything (in `jobs` processes) to
+    confirm the medoid, which takes the cost from O(n^2) alignments to O(candidates * n).
+    """
+    if not consensus_list:
+        raise ValueError("No sequences provided to choose representative.")
+    if method not in REP_METHODS:
+        raise ValueError(f"Unknown representative method {method!r}; use one of {', '.join(REP_METHODS)}.")
 
     n = len(consensus_list)
+    if method != "align":
+        kmer_sim = mean_kmer_similarity(kmer_profiles(consensus_list, k), method)
+        shortlist = np.argsort(-kmer_sim, kind="stable")[:max(1, candidates)]
+        if jobs > 1 and len(shortlist) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_rep_worker,
+                                     initargs=(consensus_list,)) as pool:
+                scores = list(pool.map(_mean_alignment, shortlist.tolist()))
+        else:
+            _init_rep_worker(consensus_list)
+            scores = [_mean_alignment(i) for i in shortlist.tolist()]
+        # Ties go to the lower index, as with np.argmax over all sequences
+        idx = int(min(zip(shortlist.tolist(), scores), key=lambda t: (-t[1], t[0]))[0])
+        return idx, consensus_list[idx]
+
+    aligner = make_aligner()
     score_matrix = np.zeros((n, n), dtype=float)
 
     for i in range(n):
@@ -188,12 +316,7 @@ def add_alignment_scores(
 
     rep = rep_seq * repeat_extend
 
-    aligner = PairwiseAligner()
-    aligner.mode = "global"
-    aligner.match_score = 1
-    aligner.mismatch_score = 0
-    aligner.open_gap_score = 0
-    aligner.extend_gap_score = 0
+    aligner = make_aligner()
 
     scores = []
     for s in df["Consensus"].astype(str):
@@ -372,11 +495,20 @@ def build_arg_parser() -> argparse.ArgumentParser:
     p.add_argument("--prefilter-start", type=int, default=None, help="Start ≥ this position")
     p.add_argument("--prefilter-end", type=int, default=None, help="Start ≤ this position")
     p.add_argument("--prefilter-period", type=int, default=None, help="Exact Period (e.g., 91)")
+    p.add_argument("--no-cache", action="store_true",
+                   help="Parse the ULTRA text every time instead of using (or creating) the <input>.parquet cache")
 
     # Representative
     g = p.add_mutually_exclusive_group()
     g.add_argument("--rep-seq", type=str, default=None, help="Manual representative sequence")
     g.add_argument("--rep-auto", action="store_true", help="Pick representative by mean similarity")
+    p.add_argument("--rep-method", choices=REP_METHODS, default="align",
+                   help="--rep-auto similarity: align (all pairs, exact) or cosine/jaccard (k-mer profile "
+                        "shortlist, confirmed by alignment; for thousands of sequences)")
+    p.add_argument("--rep-k", type=int, default=5, help="k-mer size for --rep-method cosine/jaccard (default: 5)")
+    p.add_argument("--rep-candidates", type=int, default=20,
+                   help="Shortlisted sequences aligned to confirm the representative (default: 20)")
+    p.add_argument("--jobs", type=int, default=1, help="Processes for the confirming alignments (default: 1)")
 
     p.add_argument("--repeat-extend", type=int, default=3, help="Repeat factor for array-like alignment (default: 3)")
 
@@ -412,8 +544,15 @@ def main():
     outdir: Path = args.outdir
     outdir.mkdir(parents=True, exist_ok=True)
 
-    # Load
-    df = read_ultra_tsv(args.input)
+    # Load (prefilter pushed down to the reader)
+    df = read_ultra_tsv(
+        args.input,
+        chrom_substr=args.prefilter_chr,
+        start=args.prefilter_start,
+        end=args.prefilter_end,
+        period=args.prefilter_period,
+        cache=not args.no_cache,
+    )
 
     # Optional prefilter (Python replacement for AWK lines)
     df_pref = prefilter_df(
@@ -432,7 +571,13 @@ def main():
     if args.rep_seq:
         rep = args.rep_seq
     elif args.rep_auto:
-        _, rep = pick_representative_by_similarity(df_pref["Consensus"].astype(str).tolist())
+        _, rep = pick_representative_by_similarity(
+            df_pref["Consensus"].astype(str).tolist(),
+            method=args.rep_method,
+            k=args.rep_k,
+            candidates=args.rep_candidates,
+            jobs=args.jobs,
+        )
     else:
         raise SystemExit(
             "You must specify either --rep-seq (manual) or --rep-auto (automatic representative)."
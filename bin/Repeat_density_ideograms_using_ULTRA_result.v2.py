@@ -10,6 +10,8 @@ import numpy as np
 import matplotlib.colors as mcolors
 import json
 import itertools
+from ultra_density import DENSITY_MODES, DensityPyramid, chrom_extents, class_intervals, value_runs, window_density
+from ultra_io import CompiledFilter, UltraIndex, iter_ultra_chunks, read_ultra
 
 # Define usage function
 def print_usage():
@@ -24,9 +26,18 @@ def print_usage():
                            (e.g., '1-10 20-60') (required)
       -l, --chrom_lengths  Input file with chromosome lengths (optional)
       -w, --window_size    Window size for density calculation. Default is 100kb (optional)
+      --density_mode       'count' (repeats per window, default) or 'coverage' (bp covered per window) (optional)
+      --density_style      'bars' (vector bars, default) or 'raster' (one embedded image strip per track) (optional)
+      --merge_gap          Without a window size, also merge repeats of a class this many bp apart;
+                           given without a value, the --color_break distance is used (optional, default 0)
+      --merged_bed         Write the merged intervals of every chromosome and class to this BED file (optional)
       --use_ranges         Flag to indicate that repeat classes should be treated as ranges (optional)
-      -f, --filter_file    Path to the JSON file containing filter criteria (optional)[Temporarily unavailable]
+      -f, --filter_file    Path to the JSON file containing filter criteria (optional), e.g.
+                           {"seq_id": "Gm15", "score": [">", 10], "start": ["between", 40000000, 42000000]}
       -d, --delimiter      Delimiter used in the input file (optional, default is tab) [Temporarily unavailable]
+      --chunksize          Stream the input in chunks of N rows, keeping only rows of the requested classes (optional)
+      --no-cache           Parse the ULTRA text every time instead of using the <input>.parquet cache (optional)
+      --build_pyramid      (Re)build the <input>.density.npz density pyramid before plotting (optional)
 
     Example:
       python script_name.py -i data.txt -r 1-10 20-30 -o ideogram -l chrom_lengths.txt -w 50000 --use_ranges
@@ -43,9 +54,16 @@ def parse_args():
            '-r', '--repeat_classes', type=str, nargs='+', required=True, help="space-separated list of integers or ranges of integers to create classes (e.g., '1-10 20-60')")
     parser.add_argument('-l', '--chrom_lengths', help="Optional input file with chromosome lengths.")
     parser.add_argument('-w', '--window_size', type=int, help='Window size for density calculation', default=None)
+    parser.add_argument('--density_mode', choices=DENSITY_MODES, default='count', help="Window density as the number of repeats touching each window ('count', default) or the bp of each window they cover ('coverage')")
+    parser.add_argument('--density_style', choices=['bars', 'raster'], default='bars', help="Draw density tracks as vector bars, one per run of equal windows ('bars', default), or as one raster image strip per track ('raster'; smallest files for fine windows)")
+    parser.add_argument('--merge_gap', type=int, nargs='?', const=None, default=0, help="Without --window_size, repeats of one class are drawn as merged intervals; also merge intervals at most this many bp apart. Given without a value, --color_break is used. Default 0 (only overlapping or abutting repeats)")
+    parser.add_argument('--merged_bed', help='Write the merged intervals (chromosome, start, end, class) to this BED file')
     parser.add_argument('--use_ranges', action='store_true', default=True, help="Set this flag to indicate repeat classes should be treated as ranges. Flag is active by default")
     parser.add_argument('-f', '--filter_file', help='Path to the JSON file containing filter criteria')
     parser.add_argument('-d', '--delimiter', default='\t', help='Delimiter used in the input file (default is tab)') #not currently operational. link with load_tabular_file() in script a few steps downstream
+    parser.add_argument('--chunksize', type=int, default=None, help='Stream the input in chunks of N rows, keeping only rows of the requested classes (bounded memory for very large inputs)')
+    parser.add_argument('--no-cache', action='store_true', help='Parse the ULTRA text every time instead of using (or creating) the <input>.parquet cache.')
+    parser.add_argument('--build_pyramid', action='store_true', help='(Re)build the <input>.density.npz density pyramid (see ultra_density.py) before plotting. An up-to-date pyramid is used whenever --window_size is a multiple of its base window')
     parser.add_argument('-c', '--color_break', type=int, default=100000, help='Integer describing how far apart "s. start" values must be to be grouped into a       different category. Default is 100 Kb.')
 
     return parser.parse_args()
@@ -73,31 +91,37 @@ def load_tabular_file(file_path, delimiter='\t', comment_char='#', field_identif
 
     return df
 
-# This should work for ULTRA tab-delimited files. Let's revisit optimizing this later...
-def load_ULTRA_file(file_path, num_cols=10, delimiter='\t', comment_char='#'):
-    # Read the file with the determined number of columns
-    df = pd.read_csv(file_path, delim_whitespace=True, header=None, usecols=range(num_cols), low_memory=False)
-
-    # Assign column names based on the expected structure
-    column_names = ["seq_id", "start", "length", "period", "score", "substitutions", "insertions", "deletions", "consensus", "sequence"]
-    if num_cols > len(column_names):
-        column_names.extend([f'extra_{i}' for i in range(num_cols - len(column_names))])
-
-    df.columns = column_names[:num_cols]
-
-    # Convert relevant columns to numeric types
-    df['start'] = pd.to_numeric(df['start'], errors='coerce')
-    df['length'] = pd.to_numeric(df['length'], errors='coerce')
-    df['period'] = pd.to_numeric(df['period'], errors='coerce')
-    df['score'] = pd.to_numeric(df['score'], errors='coerce')
-    df['substitutions'] = pd.to_numeric(df['substitutions'], errors='coerce')
-    df['insertions'] = pd.to_numeric(df['insertions'], errors='coerce')
-    df['deletions'] = pd.to_numeric(df['deletions'], errors='coerce')
-    df['seq_id'] = df['seq_id'].astype(str)
-
+# ULTRA tables (JSON-derived or native layout) are parsed by the shared loader in ultra_io.py
+ULTRA_RENAME = {"chr": "seq_id", "pos": "start", "len": "length", "sub": "substitutions",
+                "ins": "insertions", "del": "deletions", "cons": "consensus"}
+
+def load_ULTRA_file(file_path, period=None, cache=True, chunksize=None, keep=None, chroms=None, start=None):
+    # Every column except the raw repeat sequence, which the ideogram never uses.
+    # (min, max) period/start ranges and a chromosome selection are pushed down to the reader (and its Parquet cache).
+    columns = ["chr", "pos", "len", "period", "score", "sub", "ins", "del", "cons"]
+    if not chunksize:
+        df = read_ultra(file_path, columns=columns, chroms=chroms, period=period, start=start, cache=cache)
+        # Rename to the column names used throughout this script
+        return df.rename(columns=ULTRA_RENAME)
+
+    # Out-of-core: stream row chunks and keep only the rows selected by keep(chunk),
+    # so memory is bounded by the chunk size plus the selected rows
+    parts = []
+    for chunk in iter_ultra_chunks(file_path, columns=columns, chunksize=chunksize, chroms=chroms, period=period,
+                                   start=start, cache=cache):
+        chunk = chunk.rename(columns=ULTRA_RENAME)
+        parts.append(keep(chunk) if keep is not None else chunk)
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=list(ULTRA_RENAME.values()))
+    df['seq_id'] = df['seq_id'].astype(str).astype('category')  # chunk categories differ; rebuild one set
     return df
 
-def subset_repeat_classes(df, repeat_classes, use_ranges):
+# Overall (min, max) period covered by the requested classes, used to skip everything else at load time
+def repeat_class_bounds(repeat_classes):
+    values = [int(v) for r in repeat_classes for v in r.split('-')]
+    return min(values), max(values)
+
+# With an UltraIndex over df, each class is a searchsorted slice instead of a full-table mask
+def subset_repeat_classes(df, repeat_classes, use_ranges, index=None):
     if use_ranges:
         ranges = []
         for r in repeat_classes:
@@ -109,48 +133,26 @@ def subset_repeat_classes(df, repeat_classes, use_ranges):
                 single_value = int(r)
                 ranges.append((single_value, single_value))
 
-        df_filtered = pd.concat([df[(df['period'] >= start) & (df['period'] <= end)] for start, end in ranges])
+        if index is not None:
+            df_filtered = pd.concat([index.query(period=(start, end)) for start, end in ranges])
+        else:
+            df_filtered = pd.concat([df[(df['period'] >= start) & (df['period'] <= end)] for start, end in ranges])
         selected_classes = df_filtered['period'].unique()
     else:
         # Treat repeat_classes as a list of individual integers
         class_list = [int(r) for r in repeat_classes]
-        df_filtered = df[df['period'].isin(class_list)]
+        if index is not None:
+            df_filtered = df.iloc[np.unique(np.concatenate([index.rows(period=(c, c)) for c in class_list]))]
+        else:
+            df_filtered = df[df['period'].isin(class_list)]
         selected_classes = df_filtered['period'].unique()
 
     return df_filtered, selected_classes
 
+# The criteria are compiled into one boolean mask (see ultra_io.CompiledFilter), so the frame is sliced once
 def subset_dataframe(df, filter_criteria):
-#    # Check the first few rows of the DataFrame
-#    print("First few rows of the DataFrame before filtering:")
-#    print(df.head())
-#
-#    # Check the data types of the columns
-#    print("\nData types of the columns:")
-#    print(df.dtypes)
-#
-#    # Check the unique values or a summary of 'alignment length'
-#    print("\nSummary statistics for 'alignment length' before filtering:")
-#    print(df['alignment length'].describe())
-
-    filtered_df = df.copy()
-
-    for column, criteria in filter_criteria.items():
-        if column in df.columns:
-            if df[column].dtype == 'object':  # Handling string columns
-                if isinstance(criteria, str):
-                    filtered_df = filtered_df[filtered_df[column].str.contains(criteria)]
-            else:  # Handling numeric columns
-                if isinstance(criteria, list):
-                    if criteria[0] == '>':
-                        filtered_df = filtered_df[filtered_df[column] > criteria[1]]
-                        #QC
-                        print(criteria[0])
-                    elif criteria[0] == '<':
-                        filtered_df = filtered_df[filtered_df[column] < criteria[1]]
-                    elif criteria[0] == 'between':
-                        filtered_df = filtered_df[(filtered_df[column] >= criteria[1]) & (filtered_df[column] <= criteria[2])]
-
-    return filtered_df
+    row_filter = filter_criteria if isinstance(filter_criteria, CompiledFilter) else CompiledFilter(filter_criteria)
+    return df[row_filter.mask(df)]
 
 # Define a function to read chromosome lengths from a file
 def read_chrom_lengths(file):
@@ -166,6 +168,31 @@ def original_max_chrom_length_logic(df):
     max_chrom_length = df['start'].max()
     return max_chrom_length
 
+# Each track is drawn as a single collection (or one image), never one patch per window or repeat,
+# so SVG/PDF output stays small and quick to save however many repeats there are
+TRACK_HEIGHT = 0.1
+
+def draw_density_track(ax, track, window_size, y_position, cmap, norm, style='bars'):
+    if style == 'raster':
+        # One RGBA pixel per window; empty windows stay transparent
+        rgba = cmap(norm(track))
+        rgba[track == 0] = (0, 0, 0, 0)
+        ax.imshow(rgba[np.newaxis], extent=(0, len(track) * window_size, y_position, y_position + TRACK_HEIGHT),
+                  aspect='auto', interpolation='nearest', zorder=1)
+        return
+    # Adjacent windows with the same value share a colour and become one bar
+    first, end, value = value_runs(track)
+    if len(first):
+        colors = cmap(norm(value))
+        ax.broken_barh(np.column_stack((first, end - first)) * window_size, (y_position, TRACK_HEIGHT),
+                       facecolors=colors, edgecolors=colors, zorder=1)
+
+def draw_interval_track(ax, starts, ends, y_position, color):
+    # Intervals come from class_intervals(): overlapping repeats are indistinguishable, so only their union is drawn
+    if len(starts):
+        ax.broken_barh(np.column_stack((starts, ends - starts)), (y_position, TRACK_HEIGHT),
+                       facecolors=color, edgecolors=color, zorder=1)
+
 def main():
     # Parse the arguments
     args = parse_args()
@@ -174,9 +201,22 @@ def main():
         print_usage()
         exit(1)
 
+    # Load the filter criteria from the JSON file; seq_id, period and start conditions are also pushed down to the reader
+    filter_criteria = None
+    if args.filter_file:
+        with open(args.filter_file, 'r') as f:
+            filter_criteria = json.load(f)
+    row_filter = CompiledFilter(filter_criteria, aliases={name: column for column, name in ULTRA_RENAME.items()})
+    pushdown = row_filter.pushdown(period=repeat_class_bounds(args.repeat_classes))
+
+    def keep(chunk):
+        if row_filter:
+            chunk = subset_dataframe(chunk, row_filter)
+        return subset_repeat_classes(chunk, args.repeat_classes, args.use_ranges)[0]
+
     # Load main input file
     try:
-        df = load_ULTRA_file(args.input)
+        df = load_ULTRA_file(args.input, cache=not args.no_cache, chunksize=args.chunksize, keep=keep, **pushdown)
     except KeyError as e:
         print(f"Column not found: {e}")
         raise
@@ -184,16 +224,9 @@ def main():
         print(f"Error reading the file: {e}")
         raise
 
-   # The code immediatley below cannot be run without fitting into the code scheme optimally.
-   # if args.filter_file:
-   #     # Load the filter criteria from the JSON file
-   #     with open(args.filter_file, 'r') as f:
-   #         filter_criteria = json.load(f)
-   # if args.filter_file:
-   #     # Subset the DataFrame
-   #     filtered_df = subset_dataframe(df, filter_criteria)
-   # else:
-   #     filtered_df = df
+    # Subset the DataFrame (chunked loads were already filtered chunk by chunk)
+    if row_filter and not args.chunksize:
+        df = subset_dataframe(df, row_filter)
 
     # Initializing chrom_lengths
     chrom_lengths = None
@@ -202,7 +235,9 @@ def main():
     df['consolidated_class'] = df['period']
 
     if args.repeat_classes:
-        filtered_df, selected_classes = subset_repeat_classes(df, args.repeat_classes, args.use_ranges)
+        # One sort of the table; every class query is then an index slice
+        index = UltraIndex(df, chr_col='seq_id', period_col='period', pos_col='start')
+        filtered_df, selected_classes = subset_repeat_classes(df, args.repeat_classes, args.use_ranges, index=index)
     #QC
     pass
 
@@ -216,6 +251,8 @@ def main():
     else:
         max_chrom_length = original_max_chrom_length_logic(filtered_df)
         chromosomes = filtered_df['seq_id'].unique()
+    # Length of each chromosome as drawn: the given size, or its last repeat start
+    plot_lengths = chrom_lengths if chrom_lengths else chrom_extents(filtered_df, chr_col='seq_id', pos_col='start')
 
     # Assign colors to each class/family using a rainbow palette
     palette = sns.color_palette('rainbow', len(selected_classes))
@@ -238,61 +275,59 @@ def main():
     if len(chromosomes) == 1:
         axes = [axes]
 
-    def calculate_density(chrom_data, chrom_length, window_size):
-        density = np.zeros((chrom_length // window_size) + 1)
-        for start, end in zip(chrom_data['start'], chrom_data['start'] + chrom_data['length']):
-            start_idx = start // window_size
-            end_idx = end // window_size
-            for i in range(start_idx, end_idx + 1):
-                density[i] += 1
-        return density
-
-    # Calculate density and max density for each class separately
-    density_dict = {}
-    max_density_dict = {cls: 0 for cls in selected_classes}
-
-    for chrom in chromosomes:
-        chrom_data = filtered_df[filtered_df['seq_id'] == chrom]
-        if args.chrom_lengths:
-            chrom_length = chrom_lengths.get(chrom)
+    # Density of every chromosome x class x window in one pass (see ultra_density.py);
+    # the colour scale of each class spans its maximum over all chromosomes
+    if args.window_size: #
+        # A precomputed pyramid answers any multiple of its base window without touching the table;
+        # it holds every repeat, so it cannot serve a --filter_file subset
+        pyramid = None
+        if args.build_pyramid and not args.no_cache:
+            pyramid = DensityPyramid.build(args.input, chunksize=args.chunksize).save()
+        elif not args.no_cache:
+            pyramid = DensityPyramid.load(args.input)
+        if pyramid is not None and pyramid.supports(args.window_size) and not row_filter:
+            density = pyramid.window_density(chromosomes, selected_classes, args.window_size, plot_lengths,
+                                             mode=args.density_mode)
         else:
-            chrom_length = chrom_data['start'].max()
-        if args.window_size: #
-            window_size = args.window_size #
-            density_dict[chrom] = {}
-            for cls in selected_classes:
-                density = calculate_density(chrom_data[chrom_data['consolidated_class'] == cls], chrom_length, window_size)
-                density_dict[chrom][cls] = density
-                max_density_dict[cls] = max(max_density_dict[cls], max(density))
+            density = window_density(filtered_df, chromosomes, selected_classes, args.window_size,
+                                     chrom_lengths=plot_lengths, mode=args.density_mode, chr_col='seq_id',
+                                     class_col='consolidated_class', pos_col='start', len_col='length')
+        class_max = density.max(axis=(0, 2)) if density.size else np.zeros(num_classes)
+        max_density_dict = {cls: class_max[k] for k, cls in enumerate(selected_classes)}
+
+    # Union of the repeats of each chromosome x class, merged once in a single sweep
+    merged_groups = {}
+    if not args.window_size or args.merged_bed:
+        merge_gap = args.color_break if args.merge_gap is None else args.merge_gap
+        merged = class_intervals(filtered_df, chromosomes, selected_classes, gap=merge_gap, chr_col='seq_id',
+                                 class_col='consolidated_class', pos_col='start', len_col='length')
+        merged_groups = {key: group for key, group in merged.groupby(['chrom', 'class'], sort=False)}
+        if args.merged_bed:
+            merged.to_csv(args.merged_bed, sep='\t', header=False, index=False, columns=['chrom', 'start', 'end', 'class'])
+            print(f"Merged intervals saved to {args.merged_bed}")
 
     for chrom_idx, (ax, chrom) in enumerate(zip(axes, chromosomes)):
-        chrom_data = filtered_df[filtered_df['seq_id'] == chrom]
-        if args.chrom_lengths:
-            chrom_length = chrom_lengths.get(chrom)
-        else:
-            chrom_length = chrom_data['start'].max()
+        chrom_length = plot_lengths.get(chrom)
         # Draw the chromosome ideogram as a horizontal bar
         ax.add_patch(mpatches.Rectangle((0, 1.1), chrom_length, 0.1, color='lightgrey', zorder=0))
         if args.window_size: #
             window_size = args.window_size #
+            n_win = chrom_length // window_size + 1
             for class_idx, cls in enumerate(selected_classes):
-                density = density_dict[chrom][cls]
+                track = density[chrom_idx, class_idx, :n_win]
                 cmap = class_colormaps[cls]
                 max_density = max_density_dict[cls]
                 norm = mcolors.Normalize(vmin=0, vmax=max_density)
                 y_position = 1.0 - class_idx * 0.12  # Adjusted spacing between tracks
-                for i, count in enumerate(density):
-                    if count > 0:
-                        color = cmap(norm(count))
-                        ax.add_patch(mpatches.Rectangle((i * window_size, y_position), window_size, 0.1, color=color, zorder=1))
+                draw_density_track(ax, track, window_size, y_position, cmap, norm, style=args.density_style)
                 ax.text(-0.05 * max_chrom_length, y_position + 0.02, cls, va='center', ha='right', fontsize=10)  # Add class name for the first chromosome
         else:
             # Draw repeat sequences
             for class_idx, cls in enumerate(selected_classes):
-                class_data = chrom_data[chrom_data['consolidated_class'] == cls]
                 y_position = 1.0 - class_idx * 0.12  # Adjusted spacing between tracks
-                for _, row in class_data.iterrows():
-                    ax.add_patch(mpatches.Rectangle((row['start'], y_position), row['start'] + row['length'] - row['start'], 0.1, color=class_colors[row['consolidated_class']], zorder=1))
+                intervals = merged_groups.get((str(chrom), cls))
+                if intervals is not None:
+                    draw_interval_track(ax, intervals['start'].to_numpy(), intervals['end'].to_numpy(), y_position, class_colors[cls])
                 ax.text(-0.05 * max_chrom_length, y_position + 0.02, cls, va='center', ha='right', fontsize=10)  # Add class name for the first chromosome
         ax.set_xlim(0, max_chrom_length)
         ax.set_ylim(0.85 - num_classes * 0.12, 1.2)  # Adjusted ylim to fit tracks properly
@@ -313,7 +348,7 @@ def main():
             sm = plt.cm.ScalarMappable(cmap=class_colormaps[cls], norm=norm)
             sm.set_array([])
             cbar = plt.colorbar(sm, cax=cax)
-            cbar.set_label(f'Density of {cls}')
+            cbar.set_label(f'Density of {cls}' if args.density_mode == 'count' else f'Coverage (bp) of {cls}')
 
     # Save the plot to a SVG file
     if args.output:
@@ -8,6 +8,8 @@
 # -p chr prefix (default: Chr) used in periods/arrays pattern
 # -b bar scale  (default: 100; arrays defaults to 10 if -b not set)
 # -f file, -s start chr, -e end chr   (required)
+# Rescans the file once per chromosome; for large tables use the single-pass
+#   ultra_plot_hist.py -f file -m chrom-hist --chrom-hist periods,arrays,specific -x N --chr-prefix P --chr-range S-E
 
 ULTRA_plot_chrom_hist() {
     local file=""
@@ -42,9 +42,12 @@ n = len(sequences)
 score_matrix = np.zeros((n, n))
 
 for i in range(n):
-    for j in range(n):
-        if i != j:
-            score_matrix[i, j] = aligner.score(sequences[i], sequences[j]) / max(len(sequences[i]), len(sequences[j]))
+    for j in range(i + 1, n):  # the score is symmetric, so align each pair once
+        score_matrix[i, j] = aligner.score(sequences[i], sequences[j]) / max(len(sequences[i]), len(sequences[j]))
+        score_matrix[j, i] = score_matrix[i, j]
+
+# For thousands of sequences, DRAFT_aln_trim_by_ML_feature_class.py --rep-auto --rep-method cosine
+# shortlists candidates by k-mer profile similarity and aligns only those.
 
 # Compute mean similarity for each sequence
 mean_scores = score_matrix.mean(axis=1)
@@ -1,13 +1,20 @@
 #!/usr/bin/python3
 
+import os
 import sys
 from Bio import SeqIO
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from fasta_io import open_fasta
+
+FASTA_EXTENSIONS = (".fasta", ".fa", ".fna", ".fas")
+
 def usage():
     print("Usage: python stats_cons.py <sequence> or <fasta_file>")
     print("Examples:")
     print("  python stats_cons.py AAAACGAAGCAACAnGCATCTTCCCCTCAACTCTAACCTAAGATACCATTTAATTACTTG...")
     print("  python stats_cons.py consensus_sequences.fasta")
+    print("  python stats_cons.py consensus_sequences.fa.gz")
     sys.exit(1)
 
 def analyze_sequence(sequence, cluster_threshold=5):
@@ -51,10 +58,16 @@ def analyze_sequence(sequence, cluster_threshold=5):
     else:
         print("Ambigous calls are not clustered.")
 
+def is_fasta_path(input_data):
+    name = input_data[:-3] if input_data.endswith(".gz") else input_data
+    return name.endswith(FASTA_EXTENSIONS)
+
 def analyze_fasta(fasta_file, cluster_threshold=5):
-    for record in SeqIO.parse(fasta_file, "fasta"):
-        print(f"\nAnalyzing sequence {record.id}:")
-        analyze_sequence(str(record.seq), cluster_threshold)
+    # open_fasta streams gzip/bgzip input without decompressing it to disk
+    with open_fasta(fasta_file, "rt") as handle:
+        for record in SeqIO.parse(handle, "fasta"):
+            print(f"\nAnalyzing sequence {record.id}:")
+            analyze_sequence(str(record.seq), cluster_threshold)
 
 def main():
     if len(sys.argv) < 2:
@@ -63,7 +76,7 @@ def main():
     input_data = sys.argv[1]
     cluster_threshold = 5  # Default cluster threshold
 
-    if input_data.endswith(".fasta") or input_data.endswith(".fa"):
+    if is_fasta_path(input_data):
         # Treat input as a FASTA file
         analyze_fasta(input_data, cluster_threshold)
     else:
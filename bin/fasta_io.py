@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+fasta_io
+
+Shared input helpers for the FASTA tools in bin/ (seqlen.py, sub_fastaBYid.py,
+sub_fasta_len.py, stats_cons.py).
+
+- open_fasta(): open a plain, gzip or bgzip file (or '-' for stdin) as a stream.
+  Compressed input is decompressed on the fly, so memory stays bounded and no
+  scratch copy is written. When python-isal or pigz is available, gzip input
+  is decompressed in background threads/processes.
+- iter_fasta_records(): yield raw (header, sequence) bytes without building
+  Biopython objects.
+- BgzfReader: random access into bgzip-compressed files using a samtools-style
+  .gzi block index (built on first use if missing), so tools that seek by
+  uncompressed offset (e.g. .fai lookups) work on .fa.gz directly.
+
+Scripts in subdirectories import it with:
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+    from fasta_io import open_fasta
+"""
+
+import gzip
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import zlib
+from bisect import bisect_right
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# ---------- Format detection ----------
+def _peek(path, n):
+    with open(path, "rb") as fh:
+        return fh.read(n)
+
+def is_gzip(path):
+    """True if path is gzip (or bgzip) compressed, judged by its magic bytes."""
+    return path != "-" and _peek(path, 2) == GZIP_MAGIC
+
+def is_bgzf(path):
+    """True if path is bgzip compressed (gzip member with a 'BC' extra subfield)."""
+    if path == "-":
+        return False
+    header = _peek(path, 18)
+    return (len(header) == 18 and header[:4] == b"\x1f\x8b\x08\x04"
+            and header[12:14] == b"BC" and struct.unpack("<H", header[14:16])[0] == 2)
+
+# ---------- Streaming opener ----------
+class _PipeReader(io.RawIOBase):
+    """Readable stream over a decompressor subprocess (e.g. pigz -dc)."""
+
+    def __init__(self, proc):
+        self.proc = proc
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.proc.stdout.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.proc.stdout.close()
+            if self.proc.wait() not in (0, -13):  # -13: SIGPIPE after an early close
+                raise OSError(f"decompressor exited with status {self.proc.returncode}")
+        super().close()
+
+def _open_gzip(path, threads):
+    """Open a gzip file for binary reading, using a threaded decompressor when one is available."""
+    if threads is None:
+        threads = min(4, os.cpu_count() or 1)
+    if threads > 1:
+        try:
+            from isal import igzip_threaded
+            return igzip_threaded.open(path, "rb", threads=threads)
+        except ImportError:
+            pass
+        pigz = shutil.which("pigz")
+        if pigz:
+            proc = subprocess.Popen([pigz, "-dc", "-p", str(threads), path], stdout=subprocess.PIPE)
+            return io.BufferedReader(_PipeReader(proc), buffer_size=1 << 20)
+    return gzip.open(path, "rb")
+
+def open_fasta(path, mode="rb", threads=None):
+    """
+    Open a FASTA (or any text) file for streaming reads.
+    Arguments:
+    - path: File path, or '-' for standard input. gzip/bgzip input is detected
+      from the magic bytes, not the extension.
+    - mode: 'rb' for a binary stream or 'rt' for text.
+    - threads: Decompression threads for gzip input (None = auto, 0/1 = single-threaded).
+    Returns:
+    - A file object; use it as a context manager.
+    """
+    if mode not in ("rb", "rt"):
+        raise ValueError(f"open_fasta mode must be 'rb' or 'rt', got {mode!r}")
+
+    if path == "-":
+        handle = sys.stdin.buffer
+    elif is_gzip(path):
+        handle = _open_gzip(path, threads)
+    else:
+        handle = open(path, "rb")
+
+    return io.TextIOWrapper(handle) if mode == "rt" else handle
+
+def iter_fasta_records(handle, ids=None):
+    """
+    Yield (header, sequence) byte strings from a binary FASTA handle.
+    The header excludes the leading '>' and line ending; the sequence has all
+    line breaks removed. If ids is given, records whose ID (first header word)
+    is not in it are skipped without assembling their sequence.
+    """
+    header = None
+    lines = []
+    keep = False
+    for line in handle:
+        if line.startswith(b">"):
+            if keep:
+                yield header, b"".join(lines)
+            header = line[1:].rstrip(b"\r\n")
+            keep = ids is None or record_id(header) in ids
+            lines = []
+        elif keep:
+            lines.append(line.rstrip(b"\r\n"))
+    if keep:
+        yield header, b"".join(lines)
+
+def record_id(header):
+    """First whitespace-delimited word of a header, as str (the same ID Biopython uses)."""
+    fields = header.split(None, 1)
+    return fields[0].decode() if fields else ""
+
+# ---------- BGZF random access ----------
+def _block_size(header):
+    """Total size of the BGZF block whose first 18 bytes are header, or None if not BGZF."""
+    if len(header) < 18 or header[:4] != b"\x1f\x8b\x08\x04":
+        return None
+    xlen = struct.unpack("<H", header[10:12])[0]
+    if header[12:14] != b"BC" or xlen < 6:
+        return None
+    return struct.unpack("<H", header[16:18])[0] + 1
+
+def gzi_path(path):
+    return f"{path}.gzi"
+
+def build_gzi(path):
+    """
+    Walk the BGZF blocks of path and return (compressed_offset, uncompressed_offset)
+    pairs for every block start. Only block headers and footers are read.
+    """
+    entries = []
+    coffset = uoffset = 0
+    with open(path, "rb") as fh:
+        while True:
+            fh.seek(coffset)
+            header = fh.read(18)
+            if not header:
+                break
+            bsize = _block_size(header)
+            if bsize is None:
+                raise ValueError(f"{path} is not BGZF compressed (bad block at offset {coffset}).")
+            fh.seek(coffset + bsize - 4)
+            isize = struct.unpack("<I", fh.read(4))[0]
+            entries.append((coffset, uoffset))
+            coffset += bsize
+            uoffset += isize
+    return entries
+
+def write_gzi(entries, path):
+    # samtools/bgzip layout: uint64 count, then (compressed, uncompressed) uint64 pairs; the first block is implicit
+    pairs = [e for e in entries if e != (0, 0)]
+    with open(path, "wb") as fh:
+        fh.write(struct.pack("<Q", len(pairs)))
+        for coffset, uoffset in pairs:
+            fh.write(struct.pack("<QQ", coffset, uoffset))
+
+def read_gzi(path):
+    with open(path, "rb") as fh:
+        (count,) = struct.unpack("<Q", fh.read(8))
+        data = fh.read(16 * count)
+    entries = [(0, 0)]
+    entries.extend(struct.unpack_from("<QQ", data, 16 * i) for i in range(count))
+    return entries
+
+def load_or_build_gzi(path):
+    """Return the block index for a bgzip file, reusing <path>.gzi when it is newer than the data."""
+    index_file = gzi_path(path)
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= os.path.getmtime(path):
+        return read_gzi(index_file)
+    entries = build_gzi(path)
+    try:
+        write_gzi(entries, index_file)
+    except OSError as e:
+        print(f"Warning: could not write index {index_file} ({e}); using it in memory only.", file=sys.stderr)
+    return entries
+
+class BgzfReader:
+    """
+    Binary reader over a bgzip file that supports seek()/read() in uncompressed
+    coordinates. Only the blocks that are touched get decompressed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+        self._index = load_or_build_gzi(path)
+        self._uoffsets = [u for _, u in self._index]
+        self._pos = 0
+        self._block_idx = None
+        self._block_data = b""
+
+    def _load_block(self, i):
+        if i == self._block_idx:
+            return self._block_data
+        coffset = self._index[i][0]
+        self._fh.seek(coffset)
+        header = self._fh.read(18)
+        bsize = _block_size(header)
+        if bsize is None:
+            raise ValueError(f"{self.path}: bad BGZF block at offset {coffset}.")
+        xlen = struct.unpack("<H", header[10:12])[0]
+        block = header + self._fh.read(bsize - 18)
+        self._block_data = zlib.decompress(block[12 + xlen:-8], -15)
+        self._block_idx = i
+        return self._block_data
+
+    def seek(self, offset, whence=0):
+        if whence != 0:
+            raise ValueError("BgzfReader only supports absolute seeks.")
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def read(self, size=-1):
+        chunks = []
+        while size != 0:
+            i = bisect_right(self._uoffsets, self._pos) - 1
+            data = self._load_block(i)
+            within = self._pos - self._uoffsets[i]
+            if within >= len(data):
+                break  # end of file
+            take = data[within:] if size < 0 else data[within:within + size]
+            chunks.append(take)
+            self._pos += len(take)
+            if size > 0:
+                size -= len(take)
+        return b"".join(chunks)
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -4,12 +4,68 @@
 # Calculate and visualize GC content
 
 # Import libraries
+import os
 import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
-from sklearn.preprocessing import StandardScaler
+from concurrent.futures import ProcessPoolExecutor
+from fasta_io import iter_fasta_records, open_fasta, record_id
+from ultra_density import DensityPyramid
+from ultra_io import iter_ultra_chunks, read_ultra
+
+# Base classes used by the composition lookup table
+_GC, _AT, _N = 1, 2, 3
+
+def _composition_lut():
+    """256-entry uint8 lookup tables mapping ASCII codes to base class and soft-masking."""
+    base_class = np.zeros(256, dtype=np.uint8)
+    for bases, code in (("GCgc", _GC), ("ATat", _AT), ("Nn", _N)):
+        base_class[np.frombuffer(bases.encode(), dtype=np.uint8)] = code
+    lower = np.zeros(256, dtype=np.uint8)
+    lower[ord("a"):ord("z") + 1] = 1
+    return base_class, lower
+
+_BASE_CLASS, _LOWER = _composition_lut()
+
+# Sequence-based features: GC, AT, N and soft-masked fractions in one pass
+def sequence_composition(seq_column):
+    """
+    Calculate base composition for every sequence in a column.
+    All sequences are concatenated into one uint8 buffer, classified with a
+    lookup table and summed per row with np.add.reduceat.
+    Arguments:
+    - seq_column: The column of sequences in the dataframe (string values).
+    Returns:
+    - A dataframe (same index) with gc_content, at_content, n_content and
+      softmasked columns, each as a fraction of sequence length
+      (NaN for empty sequences).
+    """
+    seqs = seq_column.fillna("").astype(str)
+    lengths = seqs.str.len().to_numpy(dtype=np.int64)
+    buf = np.frombuffer("".join(seqs).encode("ascii", errors="replace"), dtype=np.uint8)
+
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    nonempty = lengths > 0
+
+    def per_row(mask):
+        counts = np.zeros(len(lengths), dtype=np.int64)
+        if nonempty.any():
+            # Empty rows share their start with the next row, so reduce over non-empty rows only
+            counts[nonempty] = np.add.reduceat(mask, starts[nonempty], dtype=np.int64)
+        return counts
+
+    classes = _BASE_CLASS[buf]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = np.where(nonempty, lengths, np.nan)
+        return pd.DataFrame({
+            "gc_content": per_row(classes == _GC) / denom,
+            "at_content": per_row(classes == _AT) / denom,
+            "n_content": per_row(classes == _N) / denom,
+            "softmasked": per_row(_LOWER[buf]) / denom,
+        }, index=seq_column.index)
 
 # Sequence-based features: GC content
 def gc_content(seq_column, seq_column_name):
@@ -21,18 +77,17 @@ def gc_content(seq_column, seq_column_name):
     Returns:
     - A pandas series with the GC content for each sequence.
     """
-    return seq_column.apply(lambda seq: (seq.upper().count("G") 
-                                         + seq.upper().count("C")) / len(seq))
+    return sequence_composition(seq_column)["gc_content"].rename(seq_column_name)
 
 
 # Read the file and return the dataframe
-def read_file(filename):
+def read_file(filename, cache=True):
     """
-    Reads the ULTRA file and returns a dataframe.
+    Reads the ULTRA file (JSON-derived or native layout) and returns a dataframe
+    with compact dtypes; see ultra_io.read_ultra. With cache=True the parsed
+    table is kept in a <filename>.parquet sidecar and reused on later runs.
     """
-    return pd.read_csv(filename, sep="\t", names=['chr', 'pos', 'len', 
-                        'period', 'score', 'sub', 'ins', 'del', 'cons', 
-                        'seq'], usecols=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+    return read_ultra(filename, cache=cache)
 
 # Normalize or scale the feature matrix
 def normalize_features(df, feature_columns):
@@ -44,10 +99,50 @@ def normalize_features(df, feature_columns):
     Returns:
     - Scaled numpy array.
     """
+    # Imported here so the plain GC-by-bin path does not pay for loading sklearn
+    from sklearn.preprocessing import StandardScaler
+
     X_numeric = df[feature_columns].values
     scaler = StandardScaler()
     return scaler.fit_transform(X_numeric)
 
+# Build the feature matrix (scaled features + GC content)
+def build_feature_matrix(df, feature_columns, gc_column="gc_content"):
+    """
+    Builds the feature matrix used for downstream modelling.
+    Arguments:
+    - df: DataFrame containing the data, with GC content already computed.
+    - feature_columns: List of columns to normalize.
+    - gc_column: The column containing GC content.
+    Returns:
+    - A numpy array of the scaled feature columns followed by GC content.
+    """
+    X_scaled = normalize_features(df, feature_columns)
+    return np.hstack([X_scaled, df[[gc_column]].values])
+
+# Write the feature matrix to disk
+def export_feature_matrix(X, columns, output_filename):
+    """
+    Saves a feature matrix as .npy or .parquet, chosen by the file extension.
+    Arguments:
+    - X: The feature matrix.
+    - columns: Column names (used for Parquet output).
+    - output_filename: Output path ending in .npy or .parquet.
+    """
+    if output_filename.endswith(".parquet"):
+        pd.DataFrame(X, columns=columns).to_parquet(output_filename, index=False)
+    elif output_filename.endswith(".npy"):
+        np.save(output_filename, X)
+    else:
+        raise ValueError(f"Feature export must end in .npy or .parquet: {output_filename}")
+
+def _numbered_path(template, i):
+    """Fills '#' in template with the file number, or appends _<i> before the extension."""
+    if "#" in template:
+        return template.replace("#", str(i))
+    root, ext = os.path.splitext(template)
+    return f"{root}_{i}{ext}"
+
 # Create bins from positions
 def create_bins(df, bin_size=1_000_000, position_column="pos"):
     """
@@ -88,6 +183,71 @@ def count_repeats_per_bin(df, gc_by_bin, bin_column="bin",
     gc_by_bin["repeat_count"] = df.groupby(bin_column)[gc_column].count().values
     return gc_by_bin
 
+# Out-of-core alternative to steps 1-6 below: aggregate GC per bin chunk by chunk
+def gc_by_bin_chunked(filename, seq_column_name, bin_size=1_000_000, chunksize=1_000_000, cache=True):
+    """
+    Computes the same per-bin table as group_by_bin + count_repeats_per_bin, but
+    from row chunks, so peak memory is bounded by chunksize instead of the file size.
+    Arguments:
+    - filename: The ULTRA file to read.
+    - seq_column_name: The name of the column containing sequences.
+    - bin_size: The size of bins for GC content calculation.
+    - chunksize: Rows per chunk.
+    - cache: Read through the columnar ULTRA cache (see read_file).
+    Returns:
+    - A dataframe with bin, gc_content (mean) and repeat_count columns.
+    """
+    totals = None
+    for chunk in iter_ultra_chunks(filename, columns=["pos", seq_column_name], chunksize=chunksize, cache=cache):
+        chunk["gc_content"] = gc_content(chunk[seq_column_name], seq_column_name)
+        create_bins(chunk, bin_size)
+        # Per-chunk sums and counts merge exactly; means are formed at the end
+        part = chunk.groupby("bin")["gc_content"].agg(["sum", "count"])
+        totals = part if totals is None else totals.add(part, fill_value=0)
+
+    if totals is None:
+        return pd.DataFrame({"bin": pd.Series(dtype="int64"), "gc_content": pd.Series(dtype="float64"),
+                             "repeat_count": pd.Series(dtype="int64")})
+    totals = totals.sort_index()
+    return pd.DataFrame({"bin": totals.index.astype("int64"),
+                         "gc_content": (totals["sum"] / totals["count"]).to_numpy(),
+                         "repeat_count": totals["count"].astype("int64").to_numpy()})
+
+# Steps 1-6 from the density pyramid: GC sums are stored per base window, so any
+# multiple of the base window is re-binned without reading the sequences again
+def gc_by_bin_pyramid(filename, seq_column_name, bin_size=1_000_000, cache=True, chunksize=None):
+    """
+    Computes the same per-bin table as gc_by_bin_chunked from the <filename>.density.npz
+    pyramid (see ultra_density.py). The pyramid is built, with a GC layer for
+    seq_column_name, if it is missing or stale.
+    Arguments:
+    - filename: The ULTRA file to read.
+    - seq_column_name: The name of the column containing sequences.
+    - bin_size: The size of bins for GC content calculation.
+    - cache: Read through the columnar ULTRA cache; the pyramid is a cache too,
+    so nothing is done without it.
+    - chunksize: Rows per chunk while building the pyramid.
+    Returns:
+    - A dataframe with bin, gc_content (mean) and repeat_count columns, or None when
+    cache is off or bin_size is not a multiple of the pyramid's base window.
+    """
+    if not cache:
+        return None
+    layer = f"gc_{seq_column_name}"
+    pyramid = DensityPyramid.load(filename)
+    if pyramid is None or layer not in pyramid.layers:
+        gc = ([seq_column_name], lambda chunk: gc_content(chunk[seq_column_name], seq_column_name))
+        pyramid = DensityPyramid.build(filename, extra={layer: gc}, chunksize=chunksize).save()
+    if not pyramid.supports(bin_size, [layer]):
+        return None
+
+    bins = pyramid.bin_sums("first", bin_size).index  # every bin holding a repeat start
+    gc_sum = pyramid.bin_sums(layer, bin_size).reindex(bins, fill_value=0)
+    gc_count = pyramid.bin_sums(f"{layer}_n", bin_size).reindex(bins, fill_value=0)
+    return pd.DataFrame({"bin": bins.to_numpy(dtype="int64"),
+                         "gc_content": (gc_sum / gc_count.where(gc_count > 0)).to_numpy(),
+                         "repeat_count": gc_count.to_numpy().astype("int64")})
+
 # Plot GC content by bin and save the figure
 def plot_gc_content_by_bin(gc_by_bin, bin_size, i, output_filename="output_plot.png"):
     """
@@ -99,21 +259,95 @@ def plot_gc_content_by_bin(gc_by_bin, bin_size, i, output_filename="output_plot.
     - output_filename: The name of the output plot file 
     (default is "output_plot.png").
     """
-    plt.figure(figsize=(12, 5))
-    plt.plot(gc_by_bin["bin"], gc_by_bin["gc_content"], marker="o")
-    plt.title(f"Mean GC Content per {bin_size:,} bp Bin")
+    fig, ax = plt.subplots(figsize=(12, 5))
+    ax.plot(gc_by_bin["bin"], gc_by_bin["gc_content"], marker="o")
+    ax.set_title(f"Mean GC Content per {bin_size:,} bp Bin")
     # scale X-axis manually
-    plt.xticks(ticks=gc_by_bin["bin"][::10], 
-               labels=(gc_by_bin["bin"][::10] // 1_000_000))
-    plt.xlabel("Genomic Position (Mb)")
-    plt.ylabel("Mean GC Content")
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig(output_filename, dpi=300)
-    plt.cla()
+    ax.set_xticks(gc_by_bin["bin"][::10])
+    ax.set_xticklabels(gc_by_bin["bin"][::10] // 1_000_000)
+    ax.set_xlabel("Genomic Position (Mb)")
+    ax.set_ylabel("Mean GC Content")
+    ax.grid(True)
+    fig.tight_layout()
+    fig.savefig(output_filename, dpi=300)
+    plt.close(fig)  # release the figure so memory does not grow with the number of files
+
+# Process one ULTRA file: GC per bin, plot, and return the per-bin table
+def process_gc_file(i, filename, seq_column_name, feature_columns, bin_size=1_000_000,
+                    export_features=None, cache=True, chunksize=None, pyramid=False):
+    """
+    Runs the GC-by-bin steps for a single file.
+    Arguments:
+    - i: The file number (used in the plot file name).
+    - filename: The ULTRA file to read.
+    - seq_column_name: The name of the column containing sequences.
+    - feature_columns: List of feature columns for normalization.
+    - bin_size: The size of bins for GC content calculation.
+    - export_features: Optional .npy/.parquet path ('#' = file number) for the
+    feature matrix. The matrix (and sklearn) is only used when this is set.
+    - cache: Read through the columnar ULTRA cache (see read_file).
+    - chunksize: If set, stream the file in chunks of this many rows (see
+    gc_by_bin_chunked). Ignored with export_features, whose scaling needs the
+    whole table.
+    - pyramid: Take the per-bin table from the density pyramid (see
+    gc_by_bin_pyramid), falling back to the steps below when it cannot serve
+    bin_size. Ignored with export_features.
+    Returns:
+    - A dataframe with file, file_index, bin, gc_content and repeat_count columns.
+    """
+    print(f"Processing file: {filename}")
+
+    gc_by_bin = None
+    if pyramid and not export_features:
+        # Steps 1-6 from the precomputed windows
+        gc_by_bin = gc_by_bin_pyramid(filename, seq_column_name, bin_size, cache, chunksize)
+    if gc_by_bin is None and chunksize and not export_features:
+        # Steps 1-6 chunk by chunk
+        gc_by_bin = gc_by_bin_chunked(filename, seq_column_name, bin_size, chunksize, cache)
+    if gc_by_bin is not None:
+        plot_gc_content_by_bin(gc_by_bin, bin_size, i, f"output_{i}_gc_content_by_bin.png")
+        gc_by_bin.insert(0, "file_index", i)
+        gc_by_bin.insert(0, "file", filename)
+        return gc_by_bin
+
+    # Step 1: Read the file
+    df = read_file(filename, cache=cache)
+
+    # Step 2: Calculate GC content
+    df["gc_content"] = gc_content(df[seq_column_name], seq_column_name)
+
+    # Step 3: Optional: Build and export the feature matrix
+    if export_features:
+        X_full = build_feature_matrix(df, feature_columns)
+        export_feature_matrix(X_full, list(feature_columns) + ["gc_content"],
+                              _numbered_path(export_features, i))
+
+    # Step 4: Create bins
+    create_bins(df, bin_size)
+
+    # Step 5: Group by bin and calculate mean GC content
+    gc_by_bin = group_by_bin(df)
+
+    # Step 6: Optional: Count repeats per bin
+    gc_by_bin = count_repeats_per_bin(df, gc_by_bin)
+
+    # Step 7: Plot and save
+    plot_gc_content_by_bin(gc_by_bin, bin_size, i,
+                           f"output_{i}_gc_content_by_bin.png")
+
+    gc_by_bin.insert(0, "file_index", i)
+    gc_by_bin.insert(0, "file", filename)
+    return gc_by_bin
+
+def _init_worker():
+    # Worker processes only write image files
+    plt.switch_backend("Agg")
 
 # Main function to process files
-def process_files_plot_GC_by_bin(num_files, filename_pattern, seq_column_name, feature_columns, bin_size=1_000_000):
+def process_files_plot_GC_by_bin(num_files, filename_pattern, seq_column_name, feature_columns,
+                                 bin_size=1_000_000, jobs=1,
+                                 merged_csv="gc_content_by_bin_merged.csv",
+                                 export_features=None, cache=True, chunksize=None, pyramid=False):
     """
     Main function to process multiple files with the given parameters.
     Arguments:
@@ -123,32 +357,201 @@ def process_files_plot_GC_by_bin(num_files, filename_pattern, seq_column_name, f
     - feature_columns: List of feature columns for normalization.
     - bin_size: The size of bins for GC content calculation 
     (default is 1,000,000).
+    - jobs: Number of worker processes; files are processed in parallel when > 1
+    (default is 1).
+    - merged_csv: Path for the merged per-bin GC/repeat counts of all files,
+    or None to skip it (default is "gc_content_by_bin_merged.csv").
+    - export_features: Optional .npy/.parquet path ('#' = file number) for each
+    file's feature matrix; feature building is skipped when None.
+    - cache: Read through the columnar ULTRA cache (default is True).
+    - chunksize: Stream each file in chunks of this many rows (default is
+    None: load each file whole).
+    - pyramid: Use (building if needed) each file's density pyramid for the
+    per-bin table (default is False).
+    Returns:
+    - The merged per-bin dataframe, in file order.
     """
-    for i in range(1, num_files + 1):
-        filename = filename_pattern.replace("#", str(i))
-        print(f"Processing file: {filename}")
+    tasks = [(i, filename_pattern.replace("#", str(i)), seq_column_name, feature_columns, bin_size,
+              export_features, cache, chunksize, pyramid)
+             for i in range(1, num_files + 1)]
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+            results = list(pool.map(process_gc_file, *zip(*tasks)))
+    else:
+        results = [process_gc_file(*task) for task in tasks]
 
-        # Step 1: Read the file
-        df = read_file(filename)
+    merged = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    if merged_csv:
+        merged.to_csv(merged_csv, index=False)
+        print(f"Merged per-bin table written: {merged_csv}")
+    return merged
+
+# Genome-wide GC content per window, computed from the assembly FASTA
+def _boundary_cumsum(mask, bounds):
+    """Returns cumsum(mask) sampled at the sorted, unique positions in bounds (0 through len(mask))."""
+    cs = np.zeros(len(bounds), dtype=np.int64)
+    np.cumsum(np.add.reduceat(mask, bounds[:-1], dtype=np.int64), out=cs[1:])
+    return cs
+
+def _chrom_gc_windows(chrom, seq, window_size, step):
+    """
+    Computes GC content per window for one chromosome.
+    GC and ACGT counts are summed between window boundaries only, so besides
+    the raw sequence just one byte per base (its class) is held in RAM.
+    Arguments:
+    - chrom: Chromosome (sequence) name.
+    - seq: The chromosome sequence as bytes.
+    - window_size: Window size in bp.
+    - step: Distance between window starts in bp.
+    Returns:
+    - A dataframe with chr, start, end, gc_content and n_content columns.
+    """
+    n = len(seq)
+    starts = np.arange(0, n, step, dtype=np.int64)
+    ends = np.minimum(starts + window_size, n)
+    gc = acgt = np.zeros(len(starts), dtype=np.int64)
+    if n:
+        bounds = np.unique(np.concatenate(([0, n], starts, ends)))
+        classes = _BASE_CLASS[np.frombuffer(seq, dtype=np.uint8)]
+        gc_cs = _boundary_cumsum(classes == _GC, bounds)
+        acgt_cs = gc_cs + _boundary_cumsum(classes == _AT, bounds)
+        del classes
+        lo, hi = np.searchsorted(bounds, starts), np.searchsorted(bounds, ends)
+        gc = gc_cs[hi] - gc_cs[lo]
+        acgt = acgt_cs[hi] - acgt_cs[lo]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pd.DataFrame({
+            "chr": chrom,
+            "start": starts,
+            "end": ends,
+            "gc_content": np.where(acgt > 0, gc / acgt, np.nan),
+            "n_content": 1 - acgt / (ends - starts),
+        })
+
+def fasta_gc_windows(fasta_file, window_size=1_000_000, step=None):
+    """
+    Streams an assembly FASTA and computes GC content per window, giving a
+    background GC track that also covers regions without repeats.
+    Arguments:
+    - fasta_file: Path to the FASTA file (plain, gzip or bgzip).
+    - window_size: Window size in bp (default is 1,000,000).
+    - step: Distance between window starts; smaller than window_size gives
+      sliding windows (default: window_size, i.e. fixed windows).
+    Returns:
+    - A dataframe with chr, start, end, gc_content (GC / ACGT bases) and
+      n_content (fraction of non-ACGT bases) for every window.
+    """
+    step = step or window_size
+    frames = []
+    with open_fasta(fasta_file) as handle:
+        for header, seq in iter_fasta_records(handle):
+            frames.append(_chrom_gc_windows(record_id(header), seq, window_size, step))
+    if not frames:
+        return pd.DataFrame(columns=["chr", "start", "end", "gc_content", "n_content"])
+    return pd.concat(frames, ignore_index=True)
+
+# Compare repeat GC per bin with the genome-wide background
+def compare_gc_to_background(df, gc_windows, bin_size, bin_column="bin",
+                             gc_column="gc_content"):
+    """
+    Joins mean repeat GC per (chromosome, bin) with the background GC of the
+    matching FASTA window.
+    Arguments:
+    - df: ULTRA dataframe with chr, bin (see create_bins) and GC content columns.
+    - gc_windows: Output of fasta_gc_windows with fixed windows of bin_size.
+    - bin_size: The bin size used for create_bins.
+    - bin_column: The column used for binning.
+    - gc_column: The column containing GC content.
+    Returns:
+    - A dataframe with one row per background window: chr, bin, background_gc,
+      n_content, repeat_gc, repeat_count and gc_enrichment (repeat_gc - background_gc).
+    """
+    widths = gc_windows["end"] - gc_windows["start"]
+    if (gc_windows["start"] % bin_size != 0).any() or (widths > bin_size).any():
+        raise ValueError("Background windows must be fixed windows of the same size as the repeat bins.")
 
-        # Step 2: Normalize features
-        X_scaled = normalize_features(df, feature_columns)
+    repeats = (df.groupby(["chr", bin_column], observed=True)[gc_column]
+                 .agg(repeat_gc="mean", repeat_count="count")
+                 .reset_index())
+    repeats["chr"] = repeats["chr"].astype(str)
+    background = gc_windows.rename(columns={"start": bin_column, gc_column: "background_gc"})
+    background = background.assign(chr=background["chr"].astype(str))
+    merged = background[["chr", bin_column, "background_gc", "n_content"]].merge(
+        repeats, on=["chr", bin_column], how="left")
+    merged["repeat_count"] = merged["repeat_count"].fillna(0).astype(int)
+    merged["gc_enrichment"] = merged["repeat_gc"] - merged["background_gc"]
+    return merged
 
-        # Step 3: Calculate GC content
-        df["gc_content"] = gc_content(df[seq_column_name], seq_column_name)
+# Command-line interface
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Mean GC content of ULTRA repeats per bin, or genome-wide GC per window from a FASTA.")
+    parser.add_argument("-m", "--mode", choices=["bins", "windows"], default="bins",
+                        help="bins: plot repeat GC per bin for each ULTRA file; "
+                             "windows: GC per window from the assembly FASTA. Default: bins.")
+    parser.add_argument("-p", "--pattern", help="ULTRA filename pattern with '#' for the file number (bins mode).")
+    parser.add_argument("-n", "--num-files", type=int, default=1, help="Number of files matching --pattern.")
+    parser.add_argument("-s", "--seq-column", default="seq", help="Sequence column name. Default: seq.")
+    parser.add_argument("--features", nargs="+", default=["len", "period", "score", "sub", "ins", "del"],
+                        help="Numeric feature columns for the feature matrix (used with --export-features).")
+    parser.add_argument("--export-features",
+                        help="Write each file's scaled feature matrix (+ GC) to this .npy or .parquet path; "
+                             "'#' is replaced by the file number. Off by default.")
+    parser.add_argument("-b", "--bin-size", type=int, default=1_000_000,
+                        help="Bin (and window) size in bp. Default: 1,000,000.")
+    parser.add_argument("-f", "--fasta", help="Assembly FASTA (windows mode).")
+    parser.add_argument("--step", type=int, default=None,
+                        help="Step between window starts for sliding windows (windows mode). Default: --bin-size.")
+    parser.add_argument("-u", "--ultra", help="ULTRA file to compare against the background windows (windows mode).")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes for bins mode (one file per worker). Default: 1.")
+    parser.add_argument("--merged-csv", default="gc_content_by_bin_merged.csv",
+                        help="Merged per-bin GC/repeat counts across all files (bins mode).")
+    parser.add_argument("-o", "--out", default="gc_windows.tsv", help="Output TSV for windows mode.")
+    parser.add_argument("--compare-out", default="gc_repeats_vs_background.tsv",
+                        help="Output TSV for the repeat vs background comparison (with --ultra).")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream each ULTRA file in chunks of N rows so memory is bounded by N (bins mode; "
+                             "not combined with --export-features). Default: load each file whole.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse the ULTRA text every time instead of using (or creating) the <file>.parquet cache.")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="Take per-bin GC from the <file>.density.npz pyramid, building it on first use, so "
+                             "later runs at any multiple of its 10 kb base bin skip the sequences (bins mode).")
+    return parser.parse_args()
 
-        # Step 4: Add GC content to the feature matrix
-        X_full = np.hstack([X_scaled, df[["gc_content"]].values])
+def main():
+    args = parse_args()
+    plt.switch_backend("Agg")  # the CLI only writes image files
 
-        # Step 5: Create bins
-        create_bins(df, bin_size)
+    if args.mode == "bins":
+        if not args.pattern:
+            raise SystemExit("Error: --pattern is required for -m bins.")
+        process_files_plot_GC_by_bin(args.num_files, args.pattern, args.seq_column,
+                                     args.features, args.bin_size, jobs=args.jobs,
+                                     merged_csv=args.merged_csv,
+                                     export_features=args.export_features,
+                                     cache=not args.no_cache, chunksize=args.chunksize,
+                                     pyramid=args.pyramid)
+        return
 
-        # Step 6: Group by bin and calculate mean GC content
-        gc_by_bin = group_by_bin(df)
+    if not args.fasta:
+        raise SystemExit("Error: --fasta is required for -m windows.")
+    gc_windows = fasta_gc_windows(args.fasta, args.bin_size, args.step)
+    gc_windows.to_csv(args.out, sep="\t", index=False)
+    print(f"GC windows written: {args.out}")
 
-        # Step 7: Optional: Count repeats per bin
-        gc_by_bin = count_repeats_per_bin(df, gc_by_bin)
+    if args.ultra:
+        if args.step not in (None, args.bin_size):
+            raise SystemExit("Error: --ultra comparison needs fixed windows (omit --step).")
+        df = read_file(args.ultra, cache=not args.no_cache)
+        df["gc_content"] = gc_content(df[args.seq_column], args.seq_column)
+        create_bins(df, args.bin_size)
+        comparison = compare_gc_to_background(df, gc_windows, args.bin_size)
+        comparison.to_csv(args.compare_out, sep="\t", index=False)
+        print(f"Repeat vs background GC written: {args.compare_out}")
 
-        # Step 8: Plot and save
-        plot_gc_content_by_bin(gc_by_bin, bin_size, i, 
-                               f"output_{i}_gc_content_by_bin.png")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
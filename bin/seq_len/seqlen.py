@@ -1,39 +1,246 @@
 #!/usr/bin/env python3
 
+import argparse
+import io
+import os
 import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 
-def calculate_sequence_lengths(file_handle):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from fasta_io import is_gzip, open_fasta
+
+CHUNK_SIZE = 8 << 20  # bytes read per block by the streaming scanner
+MIN_SPLIT_SIZE = 64 << 20  # files larger than this are split across workers with --jobs
+_STRIPPED = (b" ", b"\t", b"\x0b", b"\x0c")
+
+def _residue_count(segment):
+    """Count sequence characters in a block of whole or partial sequence lines."""
+    n = len(segment) - segment.count(b"\n") - segment.count(b"\r")
+    if any(ws in segment for ws in _STRIPPED):
+        # Rare: whitespace padding inside sequence lines; match line.strip() exactly
+        n = sum(len(line.strip()) for line in segment.split(b"\n"))
+    return n
+
+def iter_sequence_lengths(binary_handle, chunk_size=CHUNK_SIZE):
+    """
+    Yield (sequence_id, length) pairs from a binary FASTA handle.
+
+    Reads large blocks and locates record boundaries with bytes.find, so no
+    per-line Python work is done inside sequences.
+    """
     sequence_id = None
     sequence_length = 0
+    header_parts = []
+    in_header = False
+    at_line_start = True
+
+    while True:
+        buf = binary_handle.read(chunk_size)
+        if not buf:
+            break
+        pos, n = 0, len(buf)
+        while pos < n:
+            if in_header:
+                nl = buf.find(b"\n", pos)
+                if nl < 0:
+                    header_parts.append(buf[pos:])
+                    pos = n
+                    at_line_start = False
+                    break
+                header_parts.append(buf[pos:nl])
+                sequence_id = b"".join(header_parts)[1:].split()[0].decode()
+                sequence_length = 0
+                header_parts = []
+                in_header = False
+                at_line_start = True
+                pos = nl + 1
+                continue
+
+            if at_line_start and buf[pos:pos + 1] == b">":
+                if sequence_id is not None:
+                    yield sequence_id, sequence_length
+                in_header = True
+                continue
 
-    for line in file_handle:
-        line = line.strip()
-        if line.startswith('>'):
+            # Sequence data runs until the next line that starts with '>'
+            nxt = buf.find(b"\n>", pos)
+            end = n if nxt < 0 else nxt + 1
             if sequence_id is not None:
-                print(f"{sequence_id}\t{sequence_length}")
-            sequence_id = line[1:].split()[0]
-            sequence_length = 0
-        else:
-            sequence_length += len(line)
+                sequence_length += _residue_count(buf[pos:end])
+            at_line_start = buf[end - 1:end] == b"\n"
+            pos = end
 
-    # Print results for the last sequence
+    if in_header and header_parts:
+        # Final header without a trailing newline (previous record already emitted)
+        sequence_id = b"".join(header_parts)[1:].split()[0].decode()
+        sequence_length = 0
+
+    # Results for the last sequence
     if sequence_id is not None:
-        print(f"{sequence_id}\t{sequence_length}")
+        yield sequence_id, sequence_length
+
+def write_sequence_lengths(binary_handle, out=None, chunk_size=CHUNK_SIZE, flush_every=65536, lengths=None):
+    """
+    Stream a FASTA handle and write '<id>\\t<length>' lines to out (default stdout) in large batches.
+    If a lengths list/array is given, every sequence length is also appended to it.
+    """
+    out = out or sys.stdout
+    lines = []
+    for sequence_id, sequence_length in iter_sequence_lengths(binary_handle, chunk_size):
+        lines.append(f"{sequence_id}\t{sequence_length}\n")
+        if lengths is not None:
+            lengths.append(sequence_length)
+        if len(lines) >= flush_every:
+            out.write("".join(lines))
+            lines = []
+    if lines:
+        out.write("".join(lines))
+
+# ---------- Parallel mode ----------
+class _RangeReader:
+    """Minimal read() wrapper that stops after a fixed number of bytes."""
+
+    def __init__(self, handle, nbytes):
+        self.handle = handle
+        self.remaining = nbytes
+
+    def read(self, size):
+        if self.remaining <= 0:
+            return b""
+        data = self.handle.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+def split_at_records(path, parts):
+    """Split a FASTA file into up to `parts` byte ranges that each start at a record header."""
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, "rb") as fh:
+        for k in range(1, parts):
+            fh.seek(max(size * k // parts - 1, offsets[-1]))
+            pos = fh.tell()
+            while True:
+                block = fh.read(1 << 16)
+                if not block:
+                    pos = size
+                    break
+                hit = block.find(b"\n>")
+                if hit >= 0:
+                    pos += hit + 1
+                    break
+                pos += len(block) - 1  # keep the last byte in case "\n>" straddles blocks
+                fh.seek(pos)
+            if offsets[-1] < pos < size:
+                offsets.append(pos)
+    offsets.append(size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+def _lengths_for_range(task):
+    """Worker: return the formatted length table and raw lengths for one byte range of a file."""
+    path, start, end = task
+    lengths = array("q")
+    text = io.StringIO()
+    if end is None:
+        # Whole (possibly compressed) file
+        with open_fasta(path) as fh:
+            write_sequence_lengths(fh, out=text, lengths=lengths)
+    else:
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            write_sequence_lengths(_RangeReader(fh, end - start), out=text, lengths=lengths)
+    return text.getvalue(), lengths
+
+def assembly_stats(lengths):
+    """Return sequence count, total length, N50 and L50 for a collection of sequence lengths."""
+    ordered = sorted(lengths, reverse=True)
+    total = sum(ordered)
+    n50 = l50 = 0
+    running = 0
+    for i, length in enumerate(ordered, start=1):
+        running += length
+        if running * 2 >= total:
+            n50, l50 = length, i
+            break
+    return {"sequences": len(ordered), "total_length": total, "N50": n50, "L50": l50}
+
+def run(fasta_files, jobs=1, summary=None, out=None):
+    """
+    Write length tables for every input in order. With jobs > 1, files (and large
+    files split at record boundaries) are processed in a process pool; output order
+    is always the input order.
+    """
+    out = out or sys.stdout
+    per_file = []
+
+    if jobs <= 1:
+        for fasta_file in fasta_files:
+            lengths = array("q") if summary else None
+            if fasta_file == '-':
+                write_sequence_lengths(sys.stdin.buffer, out, lengths=lengths)
+            else:
+                with open_fasta(fasta_file) as file_handle:
+                    write_sequence_lengths(file_handle, out, lengths=lengths)
+            per_file.append((fasta_file, lengths))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # Submit everything up front; results are consumed in input order
+            pending = []
+            for fasta_file in fasta_files:
+                if fasta_file == '-':
+                    pending.append((fasta_file, None))
+                    continue
+                if is_gzip(fasta_file):
+                    ranges = [(0, None)]  # compressed streams cannot be split by byte offset
+                else:
+                    parts = max(1, min(jobs, os.path.getsize(fasta_file) // MIN_SPLIT_SIZE))
+                    ranges = split_at_records(fasta_file, parts) if parts > 1 else [(0, os.path.getsize(fasta_file))]
+                futures = [pool.submit(_lengths_for_range, (fasta_file, start, end)) for start, end in ranges]
+                pending.append((fasta_file, futures))
+
+            for fasta_file, futures in pending:
+                lengths = array("q")
+                if futures is None:
+                    write_sequence_lengths(sys.stdin.buffer, out, lengths=lengths)
+                else:
+                    for future in futures:
+                        text, part_lengths = future.result()
+                        out.write(text)
+                        lengths.extend(part_lengths)
+                per_file.append((fasta_file, lengths))
+
+    if summary:
+        with open(summary, "w") as fh:
+            fh.write("file\tsequences\ttotal_length\tN50\tL50\n")
+            for fasta_file, lengths in per_file:
+                stats = assembly_stats(lengths)
+                name = "stdin" if fasta_file == '-' else fasta_file
+                fh.write(f"{name}\t{stats['sequences']}\t{stats['total_length']}\t{stats['N50']}\t{stats['L50']}\n")
 
 def usage():
-    print(f"Usage: {sys.argv[0]} [fasta_file...]")
+    print(f"Usage: {sys.argv[0]} [--jobs N] [--summary FILE] [fasta_file...]")
     print("Generate sequence ID & sequence length from FASTA sequence(s).")
     print("\nIf no input file is specified or if the file is '-', reads from standard input.")
+    print("\nOptions:")
+    print("  -j, --jobs N      Process files (and large files split at record boundaries) with N worker processes.")
+    print("                    Output order always follows the input order.")
+    print("  -s, --summary F   Also write a per-file TSV with sequence count, total length, N50 and L50 to F.")
     sys.exit(1)
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-s", "--summary")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("fasta_files", nargs="*")
+    args = parser.parse_args(argv)
+    if args.help or not args.fasta_files:
+        usage()
+    return args
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         usage()
 
-    for fasta_file in sys.argv[1:]:
-        if fasta_file == '-':
-            calculate_sequence_lengths(sys.stdin)
-        else:
-            with open(fasta_file, 'r') as file_handle:
-                calculate_sequence_lengths(file_handle)
-
+    args = parse_args(sys.argv[1:])
+    run(args.fasta_files, jobs=args.jobs, summary=args.summary)
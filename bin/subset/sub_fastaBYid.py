@@ -1,46 +1,255 @@
 #!/usr/bin/env python3
 
+import argparse
+import os
 import sys
-from Bio import SeqIO
+from collections import namedtuple
 
-def usage():
-    print("""
-Usage: python subset_fasta.py <input_fasta> <id_list_file> <output_fasta>
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from fasta_io import BgzfReader, is_bgzf, is_gzip, open_fasta
 
-Arguments:
-    <input_fasta>   : Path to the input FASTA file.
-    <id_list_file>  : Path to the file containing sequence IDs to keep, one per line.
-    <output_fasta>  : Path to the output FASTA file that will contain the subset sequences.
+# One line of a samtools-compatible .fai index
+FaiEntry = namedtuple("FaiEntry", ["name", "length", "offset", "linebases", "linewidth"])
 
+COPY_BLOCK = 1 << 20  # 1 MiB copy buffer for raw sequence bytes
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Subset a FASTA file to the sequence IDs listed in a file, one per line.",
+        epilog="""
 Example:
-    python subset_fasta.py input.fasta id_list.txt subset.fasta
-""")
-    sys.exit(1)
+    python sub_fastaBYid.py input.fasta id_list.txt subset.fasta
+    python sub_fastaBYid.py --keep-order input.fasta id_list.txt subset.fasta
 
-def subset_fasta(input_fasta, id_list_file, output_fasta):
-    # Load the list of IDs to keep
+A samtools-compatible index (<input_fasta>.fai) is built on first use and reused
+afterwards; it is rebuilt automatically when the FASTA is newer than the index or
+its size no longer matches. Records are copied as raw bytes, so the original
+headers and line wrapping are preserved.
+
+gzip input is streamed; bgzip input (bgzip -i / samtools faidx style) is read
+with random access through a .gzi block index next to the .fai.
+""",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("input_fasta", help="Path to the input FASTA file.")
+    parser.add_argument("id_list_file", help="Path to the file containing sequence IDs to keep, one per line.")
+    parser.add_argument("output_fasta", help="Path to the output FASTA file that will contain the subset sequences.")
+    parser.add_argument("--keep-order", action="store_true",
+                        help="Write records in the order of the ID list instead of the order of the input FASTA.")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Stream through the input instead of using (or creating) a .fai index.")
+    return parser.parse_args()
+
+# ---------- .fai index ----------
+def fai_path(input_fasta):
+    return f"{input_fasta}.fai"
+
+def build_fai(input_fasta):
+    """
+    Scan a FASTA file once and return its .fai entries.
+    Raises ValueError if a record has inconsistent line lengths, since such
+    records cannot be addressed by byte offset.
+    """
+    entries = []
+    name = None
+    length = offset = linebases = linewidth = 0
+    short_line_seen = False
+    pos = 0
+
+    with open_fasta(input_fasta) as fh:
+        for line in fh:
+            line_len = len(line)
+            if line.startswith(b">"):
+                if name is not None:
+                    entries.append(FaiEntry(name, length, offset, linebases, linewidth))
+                fields = line[1:].split()
+                name = fields[0].decode() if fields else ""
+                length = linebases = linewidth = 0
+                offset = pos + line_len
+                short_line_seen = False
+            elif name is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if bases == 0:
+                    short_line_seen = True
+                elif short_line_seen:
+                    raise ValueError(f"Different line length in sequence '{name}'; cannot index {input_fasta}.")
+                else:
+                    if linebases == 0:
+                        linebases, linewidth = bases, line_len
+                    elif bases > linebases:
+                        raise ValueError(f"Different line length in sequence '{name}'; cannot index {input_fasta}.")
+                    if bases < linebases or line_len < linewidth:
+                        short_line_seen = True
+                    length += bases
+            pos += line_len
+
+    if name is not None:
+        entries.append(FaiEntry(name, length, offset, linebases, linewidth))
+    return entries
+
+def write_fai(entries, path):
+    with open(path, "w") as fh:
+        for e in entries:
+            fh.write(f"{e.name}\t{e.length}\t{e.offset}\t{e.linebases}\t{e.linewidth}\n")
+
+def read_fai(path):
+    entries = []
+    with open(path) as fh:
+        for line in fh:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                continue
+            entries.append(FaiEntry(fields[0], *map(int, fields[1:5])))
+    return entries
+
+def record_nbytes(entry):
+    """Number of raw bytes occupied by a record's sequence lines (including newlines)."""
+    if entry.linebases == 0:
+        return 0
+    full_lines, rem = divmod(entry.length, entry.linebases)
+    nbytes = full_lines * entry.linewidth
+    if rem:
+        nbytes += rem + (entry.linewidth - entry.linebases)
+    return nbytes
+
+def _fai_is_fresh(input_fasta, index_file, entries):
+    """An index is stale if the FASTA is newer than it or its size no longer matches the last record."""
+    if os.path.getmtime(index_file) < os.path.getmtime(input_fasta):
+        return False
+    if is_gzip(input_fasta):
+        return True  # .fai offsets are uncompressed; the mtime check is all we can do cheaply
+    if not entries:
+        return os.path.getsize(input_fasta) == 0
+    last = max(entries, key=lambda e: e.offset)
+    expected_end = last.offset + record_nbytes(last)
+    return abs(os.path.getsize(input_fasta) - expected_end) <= max(last.linewidth, 2)
+
+def load_or_build_fai(input_fasta):
+    """
+    Return the .fai entries for input_fasta as a dict keyed by sequence name,
+    reusing <input_fasta>.fai when it is still fresh and (re)building it otherwise.
+    """
+    index_file = fai_path(input_fasta)
+    entries = None
+    if os.path.exists(index_file):
+        entries = read_fai(index_file)
+        if not _fai_is_fresh(input_fasta, index_file, entries):
+            print(f"Index {index_file} is out of date; rebuilding.", file=sys.stderr)
+            entries = None
+
+    if entries is None:
+        entries = build_fai(input_fasta)
+        try:
+            write_fai(entries, index_file)
+        except OSError as e:
+            print(f"Warning: could not write index {index_file} ({e}); using it in memory only.", file=sys.stderr)
+
+    return {e.name: e for e in entries}
+
+# ---------- Raw record extraction ----------
+def _read_header(fh, seq_offset):
+    """Return the raw header line (with its newline) that ends right before seq_offset."""
+    step = 1024
+    while True:
+        start = max(0, seq_offset - step)
+        fh.seek(start)
+        block = fh.read(seq_offset - start)
+        body = block.rstrip(b"\r\n")
+        nl = body.rfind(b"\n")
+        if nl >= 0 or start == 0:
+            return block[nl + 1:]
+        step *= 2
+
+def copy_record(fh, entry, output_handle):
+    """Copy one record (header + sequence lines) from fh to output_handle without parsing it."""
+    output_handle.write(_read_header(fh, entry.offset))
+    fh.seek(entry.offset)
+    remaining = record_nbytes(entry)
+    last = b""
+    while remaining > 0:
+        block = fh.read(min(COPY_BLOCK, remaining))
+        if not block:
+            break
+        output_handle.write(block)
+        remaining -= len(block)
+        last = block
+    if last and not last.endswith(b"\n"):
+        output_handle.write(b"\n")  # last record of a file without a trailing newline
+
+def _stream_records(input_fasta, ids_to_keep):
+    """Yield (id, raw_record_bytes) for wanted records by scanning the file once."""
+    current_id = None
+    chunks = []
+    with open_fasta(input_fasta) as fh:
+        for line in fh:
+            if line.startswith(b">"):
+                if current_id is not None:
+                    yield current_id, b"".join(chunks)
+                fields = line[1:].split()
+                record_id = fields[0].decode() if fields else ""
+                current_id = record_id if record_id in ids_to_keep else None
+                chunks = [line]
+            elif current_id is not None:
+                chunks.append(line)
+    if current_id is not None:
+        yield current_id, b"".join(chunks)
+
+# ---------- Subsetting ----------
+def read_id_list(id_list_file):
+    """Read IDs to keep, dropping blank lines and duplicates but preserving order."""
     with open(id_list_file) as f:
-        ids_to_keep = set(line.strip() for line in f)
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
 
-    # Open the output file for writing
-    with open(output_fasta, "w") as output_handle:
-        # Iterate through the FASTA file and write matching sequences to the output file
-        for record in SeqIO.parse(input_fasta, "fasta"):
-            if record.id in ids_to_keep:
-                SeqIO.write(record, output_handle, "fasta")
+def subset_fasta(input_fasta, id_list_file, output_fasta, keep_order=False, use_index=True):
+    # Load the list of IDs to keep
+    ids = read_id_list(id_list_file)
+    ids_to_keep = set(ids)
+
+    index = None
+    if use_index and is_gzip(input_fasta) and not is_bgzf(input_fasta):
+        print(f"{input_fasta} is gzip but not bgzip compressed; streaming instead of indexing.", file=sys.stderr)
+        use_index = False
+    if use_index:
+        try:
+            index = load_or_build_fai(input_fasta)
+        except ValueError as e:
+            print(f"Warning: {e} Falling back to streaming.", file=sys.stderr)
+
+    found = set()
+    with open(output_fasta, "wb") as output_handle:
+        if index is not None:
+            # Seek straight to each requested record and copy its bytes
+            entries = [index[i] for i in ids if i in index]
+            if not keep_order:
+                entries.sort(key=lambda e: e.offset)
+            reader = BgzfReader(input_fasta) if is_gzip(input_fasta) else open(input_fasta, "rb")
+            with reader as fh:
+                for entry in entries:
+                    copy_record(fh, entry, output_handle)
+                    found.add(entry.name)
+        elif keep_order:
+            # Streaming, but records must be held until they can be written in ID-list order
+            records = dict(_stream_records(input_fasta, ids_to_keep))
+            for i in ids:
+                if i in records:
+                    output_handle.write(records[i])
+                    found.add(i)
+        else:
+            for record_id, raw in _stream_records(input_fasta, ids_to_keep):
+                output_handle.write(raw)
+                found.add(record_id)
+
+    missing = [i for i in ids if i not in found]
+    if missing:
+        shown = ", ".join(missing[:10]) + (" ..." if len(missing) > 10 else "")
+        print(f"Warning: {len(missing)} of {len(ids)} IDs not found in {input_fasta}: {shown}", file=sys.stderr)
 
     print(f"Subset FASTA file created: {output_fasta}")
+    return missing
 
 if __name__ == "__main__":
-    # Check if the correct number of arguments are provided
-    if len(sys.argv) != 4:
-        usage()
-
-    # Get arguments from the command line
-    input_fasta = sys.argv[1]
-    id_list_file = sys.argv[2]
-    output_fasta = sys.argv[3]
+    args = parse_args()
 
     # Run the subset function
-    subset_fasta(input_fasta, id_list_file, output_fasta)
-
+    subset_fasta(args.input_fasta, args.id_list_file, args.output_fasta,
+                 keep_order=args.keep_order, use_index=not args.no_index)
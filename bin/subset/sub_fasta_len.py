@@ -1,15 +1,136 @@
-from Bio import SeqIO
+#!/usr/bin/env python3
 
-input_fasta = "input.fasta"  # Replace with your actual input file
-output_fasta = "output.fasta"  # The file to save trimmed sequences
+import argparse
+import os
+import sys
+from collections import defaultdict
 
-start, end = 60, 213  # Define the range (1-based indexing)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from fasta_io import iter_fasta_records, open_fasta, record_id
 
-with open(output_fasta, "w") as output_handle:
-    for record in SeqIO.parse(input_fasta, "fasta"):
-        trimmed_seq = record.seq[start-1:end]  # Extract the range
-        record.seq = trimmed_seq
-        SeqIO.write(record, output_handle, "fasta")
+WRITE_BUFFER = 4 << 20  # bytes buffered by the output writer
+COMPLEMENT = bytes.maketrans(b"ACGTURYKMBDHVNacgturykmbdhvn", b"TGCAAYRMKVHDBNtgcaayrmkvhdbn")
 
-print(f"Trimmed sequences saved to {output_fasta}")
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Trim FASTA sequences to one fixed window or to many regions listed in a BED file.",
+        epilog="""
+Examples:
+    # Same window (1-based, inclusive) for every sequence, as the old hard-coded script did
+    python sub_fasta_len.py -i input.fasta -o output.fasta -r 60-213
 
+    # Many windows per sequence from a BED file (0-based, half-open; optional name and strand)
+    python sub_fasta_len.py -i genome.fna.gz -b monomers.bed -o monomers.fasta
+""",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("-i", "--input", required=True, help="Input FASTA (plain, gzip or bgzip; '-' for stdin).")
+    parser.add_argument("-o", "--output", default="-", help="Output FASTA (default: stdout).")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("-b", "--bed", help="BED file of regions: chrom, start, end[, name[, score[, strand]]].")
+    group.add_argument("-r", "--range", help="START-END window (1-based, inclusive) applied to every sequence.")
+    parser.add_argument("-w", "--width", type=int, default=60,
+                        help="Output line width (default: 60; 0 writes each sequence on one line).")
+    return parser.parse_args()
+
+# ---------- Regions ----------
+def parse_range(spec):
+    """Parse '60-213' (1-based, inclusive) into a 0-based half-open (start, end)."""
+    try:
+        start, end = (int(x) for x in spec.split("-"))
+    except ValueError:
+        raise SystemExit(f"-r must be START-END (e.g. 60-213). Got: {spec!r}")
+    if start < 1 or end < start:
+        raise SystemExit(f"-r must satisfy 1 <= START <= END. Got: {spec!r}")
+    return start - 1, end
+
+def read_bed(bed_file):
+    """
+    Read a BED file into {sequence_id: [(start, end, name, strand), ...]} keeping file order.
+    Header, track and browser lines are skipped.
+    """
+    regions = defaultdict(list)
+    with open(bed_file) as fh:
+        for line_no, line in enumerate(fh, start=1):
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 3:
+                raise SystemExit(f"{bed_file}:{line_no}: expected at least 3 tab-separated columns.")
+            try:
+                start, end = int(fields[1]), int(fields[2])
+            except ValueError:
+                raise SystemExit(f"{bed_file}:{line_no}: start/end must be integers.")
+            name = fields[3] if len(fields) > 3 and fields[3] not in ("", ".") else None
+            strand = fields[5] if len(fields) > 5 else "+"
+            regions[fields[0]].append((start, end, name, strand))
+    return regions
+
+# ---------- Output ----------
+def write_record(out, header, seq, width):
+    out.write(b">" + header + b"\n")
+    if width > 0 and len(seq) > width:
+        out.write(b"\n".join(seq[i:i + width] for i in range(0, len(seq), width)))
+        out.write(b"\n")
+    else:
+        out.write(seq + b"\n")
+
+def reverse_complement(seq):
+    return seq.translate(COMPLEMENT)[::-1]
+
+# ---------- Trimming ----------
+def trim_by_range(input_fasta, out, start, end, width=60):
+    """Write seq[start:end] of every record, keeping the original header."""
+    with open_fasta(input_fasta) as handle:
+        for header, seq in iter_fasta_records(handle):
+            write_record(out, header, seq[start:end], width)
+
+def trim_by_bed(input_fasta, out, regions, width=60):
+    """
+    Write every BED region in one pass over the input. Records are visited in
+    FASTA order and regions in BED order within each record.
+    Returns (number of regions written, IDs from the BED that were not found).
+    """
+    written = empty = 0
+    seen = set()
+    with open_fasta(input_fasta) as handle:
+        for header, seq in iter_fasta_records(handle, ids=regions):
+            seq_id = record_id(header)
+            seen.add(seq_id)
+            for start, end, name, strand in regions[seq_id]:
+                piece = seq[max(start, 0):min(end, len(seq))]
+                if not piece:
+                    empty += 1
+                    continue
+                if strand == "-":
+                    piece = reverse_complement(piece)
+                label = name or f"{seq_id}:{start}-{end}" + ("(-)" if strand == "-" else "")
+                write_record(out, label.encode(), piece, width)
+                written += 1
+    if empty:
+        print(f"Warning: {empty} regions fell outside their sequence and were skipped.", file=sys.stderr)
+    return written, sorted(set(regions) - seen)
+
+def main():
+    args = parse_args()
+
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb", buffering=WRITE_BUFFER)
+    try:
+        if args.range:
+            start, end = parse_range(args.range)
+            trim_by_range(args.input, out, start, end, args.width)
+        else:
+            written, missing = trim_by_bed(args.input, out, read_bed(args.bed), args.width)
+            if missing:
+                shown = ", ".join(missing[:10]) + (" ..." if len(missing) > 10 else "")
+                print(f"Warning: {len(missing)} BED sequences not found in {args.input}: {shown}", file=sys.stderr)
+            print(f"{written} regions written", file=sys.stderr)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    if args.output != "-":
+        print(f"Trimmed sequences saved to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
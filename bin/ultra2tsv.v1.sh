@@ -14,6 +14,10 @@
 #: AUTHOR:       Brandon Jordan
 #: LICENSE:      MIT
 #: DATE:         2025-10-14
+#: NOTE:         Superseded by ultra_json.py, which streams ULTRA JSON with a real
+#:               JSON parser (keeping the nested SubRepeats) into the Parquet cache
+#:               read by the Python tools; they also accept the .json directly.
+#:               Equivalent TSV output: python ultra_json.py --tsv --no-cache <json_file>
 #===============================================================================
 
 print_help() { grep -E '^#:' "$0" | sed 's/^#:[ ]\?//'; }
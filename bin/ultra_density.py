@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+ultra_density
+
+Window density of ULTRA repeats along chromosomes, used by
+Repeat_density_ideograms_using_ULTRA_result.v2.py.
+
+window_density() computes every chromosome x class x window value in one pass:
+each repeat is reduced to its first and last window index, the (chromosome,
+class) pair becomes a row of a flat difference array, and a single bincount
+plus cumsum turns the +1/-1 marks into per-window values. No Python loop runs
+over repeats or windows.
+
+Two modes:
+- "count": number of repeats touching each window. A repeat spanning
+  [start, start + length) is counted in windows start // w through
+  (start + length) // w, as the ideogram script always did.
+- "coverage": base pairs of each window covered by repeats of the class
+  (overlapping repeats are summed, so a value can exceed the window size).
+
+    density = window_density(df, ["Gm01", "Gm02"], [91, 92], 100_000, mode="coverage")
+    density[0, 1]   # windows of Gm01 for period 92
+
+For drawing, value_runs() collapses a track into runs of equal adjacent windows
+and merge_intervals() takes the union of raw repeat intervals, so a track is a
+few bars rather than one per window or repeat. class_intervals() does the union
+for every chromosome x class at once, optionally bridging gaps up to a given
+size, and returns the merged intervals as a BED-like table.
+
+DensityPyramid precomputes per-chromosome, per-period window sums at a base
+resolution (10 kb by default) plus coarser levels (100 kb, 1 Mb) and saves them
+as <input>.density.npz. Density at any multiple of the base window is then a
+reduction of stored windows, with the same result as window_density(). As a
+CLI this module builds the pyramids:
+
+    python ultra_density.py results/sample.tsv
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from ultra_io import DEFAULT_CHUNK_ROWS, iter_ultra_chunks, source_key
+
+DENSITY_MODES = ("count", "coverage")
+
+def chrom_extents(df, chr_col="chr", pos_col="pos"):
+    """Largest repeat start per chromosome, the length used when no chromosome sizes are given."""
+    return df.groupby(chr_col, observed=True)[pos_col].max().to_dict()
+
+def n_windows(chrom_length, window_size):
+    """Number of windows covering a chromosome (the last one may be partial)."""
+    return int(chrom_length) // window_size + 1
+
+def window_density(df, chromosomes, classes, window_size, chrom_lengths=None, mode="count",
+                   chr_col="chr", class_col="period", pos_col="pos", len_col="len"):
+    """
+    Per-window density of every class on every chromosome.
+    Arguments:
+    - df: ULTRA table; rows whose chromosome or class is not requested are ignored.
+    - chromosomes: Chromosome names, in output order.
+    - classes: Class values (matched against class_col), in output order.
+    - window_size: Window width in bp.
+    - chrom_lengths: {chromosome: length}; defaults to the largest repeat start per chromosome.
+    - mode: "count" or "coverage" (see the module docstring).
+    Returns an int64 array of shape (len(chromosomes), len(classes), max windows).
+    Windows past the end of a shorter chromosome stay zero; repeats reaching past
+    its end are clipped to its last window.
+    """
+    if mode not in DENSITY_MODES:
+        raise ValueError(f"Unknown density mode {mode!r}; expected one of {', '.join(DENSITY_MODES)}.")
+    if window_size <= 0:
+        raise ValueError("window_size must be a positive integer.")
+    chromosomes = [str(c) for c in chromosomes]
+    classes = list(classes)
+    if chrom_lengths is None:
+        chrom_lengths = chrom_extents(df, chr_col, pos_col)
+    lengths = {str(c): int(v) for c, v in chrom_lengths.items() if pd.notna(v)}
+    last = np.array([n_windows(lengths.get(c, 0), window_size) - 1 for c in chromosomes], dtype=np.int64)
+    n_win = int(last.max()) + 1 if len(chromosomes) else 0
+    shape = (len(chromosomes), len(classes), n_win)
+    if not len(chromosomes) or not len(classes) or not len(df):
+        return np.zeros(shape, dtype=np.int64)
+
+    # (chromosome, class) codes for every row in one pass; -1 marks rows not asked for
+    chrom_code = pd.Categorical(df[chr_col].astype(str), categories=chromosomes).codes.astype(np.int64)
+    class_code = pd.Categorical(df[class_col], categories=classes).codes.astype(np.int64)
+    keep = (chrom_code >= 0) & (class_code >= 0)
+    chrom_code, class_code = chrom_code[keep], class_code[keep]
+    start = df[pos_col].to_numpy()[keep].astype(np.int64)
+    end = start + df[len_col].to_numpy()[keep].astype(np.int64)
+
+    # Drop repeats starting past their chromosome; clip the rest to its last window
+    chrom_last = last[chrom_code]
+    inside = start // window_size <= chrom_last
+    chrom_code, class_code, chrom_last = chrom_code[inside], class_code[inside], chrom_last[inside]
+    start, end = start[inside], end[inside]
+    end = np.minimum(end, (chrom_last + 1) * window_size)
+    first_win = start // window_size
+
+    # Each (chromosome, class) track is a row of n_win + 1 cells; the extra cell absorbs end marks
+    base = (chrom_code * len(classes) + class_code) * (n_win + 1)
+    size = len(chromosomes) * len(classes) * (n_win + 1)
+    if mode == "count":
+        last_win = np.minimum(end // window_size, chrom_last)
+        diff = np.bincount(base + first_win, minlength=size) - np.bincount(base + last_win + 1, minlength=size)
+        density = np.cumsum(diff.reshape(shape[0], shape[1], n_win + 1), axis=2)
+    else:
+        # Partial first and last windows are added directly; the full windows in between
+        # get window_size each through the difference array
+        last_win = np.maximum((end - 1) // window_size, first_win)
+        same = first_win == last_win
+        head = np.where(same, end - start, (first_win + 1) * window_size - start)
+        tail = np.where(same, 0, end - last_win * window_size)
+        full = np.where(last_win - first_win > 1, window_size, 0)
+        partial = (np.bincount(base + first_win, weights=head, minlength=size)
+                   + np.bincount(base + last_win, weights=tail, minlength=size))
+        diff = (np.bincount(base + first_win + 1, weights=full, minlength=size)
+                - np.bincount(base + last_win, weights=full, minlength=size))
+        shaped = (shape[0], shape[1], n_win + 1)
+        density = partial.reshape(shaped) + np.cumsum(diff.reshape(shaped), axis=2)
+        density = np.rint(density).astype(np.int64)
+    return np.ascontiguousarray(density[:, :, :n_win])
+
+def value_runs(track):
+    """
+    Runs of consecutive windows holding the same non-zero value in a 1-D track.
+    Returns (first, end, value) arrays; run k covers windows first[k] to end[k] - 1.
+    A track drawn with one colour per value needs one bar per run, not per window.
+    """
+    track = np.asarray(track)
+    idx = np.flatnonzero(track)
+    if not len(idx):
+        return idx, idx, track[idx]
+    # A run ends where the next non-zero window is not adjacent or holds another value
+    breaks = np.flatnonzero((np.diff(idx) != 1) | (np.diff(track[idx]) != 0)) + 1
+    first = idx[np.r_[0, breaks]]
+    end = idx[np.r_[breaks - 1, len(idx) - 1]] + 1
+    return first, end, track[first]
+
+def merge_intervals(starts, ends, gap=0):
+    """
+    Union of half-open [start, end) intervals: overlapping or abutting intervals
+    become one, and so do intervals separated by at most gap bp.
+    Returns (starts, ends) sorted by start.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    # Sweep: an interval opens a new block when it starts past everything before it
+    reach = np.maximum.accumulate(ends)
+    opens = np.flatnonzero(np.r_[True, starts[1:] > reach[:-1] + gap])
+    return starts[opens], np.maximum.reduceat(ends, opens)
+
+def class_intervals(df, chromosomes, classes, gap=0,
+                    chr_col="chr", class_col="period", pos_col="pos", len_col="len"):
+    """
+    Merged repeat intervals of every class on every chromosome (see merge_intervals).
+    Returns a DataFrame with columns chrom, class, start, end (half-open, BED
+    coordinates), ordered by chromosome and class as given, then by start.
+    """
+    chromosomes = [str(c) for c in chromosomes]
+    classes = list(classes)
+    chrom_code = pd.Categorical(df[chr_col].astype(str), categories=chromosomes).codes.astype(np.int64)
+    class_code = pd.Categorical(df[class_col], categories=classes).codes.astype(np.int64)
+    keep = (chrom_code >= 0) & (class_code >= 0)
+    start = df[pos_col].to_numpy()[keep].astype(np.int64)
+    end = start + df[len_col].to_numpy()[keep].astype(np.int64)
+    if not len(start):
+        return pd.DataFrame({"chrom": pd.Series(dtype=str), "class": pd.Series(dtype=object),
+                             "start": pd.Series(dtype=np.int64), "end": pd.Series(dtype=np.int64)})
+
+    # Lay the (chromosome, class) tracks end to end on one axis, each further than gap
+    # from the next, so a single sweep merges all of them without crossing tracks
+    group = chrom_code[keep] * len(classes) + class_code[keep]
+    stride = int(end.max()) + int(gap) + 1
+    starts, ends = merge_intervals(group * stride + start, group * stride + end, gap)
+    group = starts // stride
+    return pd.DataFrame({
+        "chrom": np.asarray(chromosomes, dtype=object)[group // len(classes)],
+        "class": np.asarray(classes, dtype=object)[group % len(classes)],
+        "start": starts - group * stride,
+        "end": ends - group * stride,
+    })
+
+# ---------- Density pyramid ----------
+# Per-window sums at a base resolution, aggregated into coarser levels and kept next to
+# the input, so density at any multiple of the base window is a reduction of stored
+# windows instead of a scan of the table.
+
+PYRAMID_VERSION = 1
+DEFAULT_BASE = 10_000  # bp per window at the finest level
+DEFAULT_FACTORS = (1, 10, 100)  # levels stored, as multiples of the base window (10 kb, 100 kb, 1 Mb)
+
+def pyramid_path(path):
+    return f"{path}.density.npz"
+
+def _repeat_windows(start, end, base):
+    """Expand repeats to (row, window, bp covered) for every base window they overlap."""
+    first = start // base
+    last = np.maximum((end - 1) // base, first)
+    n = last - first + 1
+    row = np.repeat(np.arange(len(start)), n)
+    win = np.repeat(first, n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    bp = np.minimum(end[row], (win + 1) * base) - np.maximum(start[row], win * base)
+    return row, win, bp
+
+def _chunk_cells(chunk, base, extra):
+    """Sums of every layer per (layer, chromosome, period, base window) for one chunk."""
+    chrom = chunk["chr"].astype(str).to_numpy()
+    period = chunk["period"].to_numpy().astype(np.int64)
+    start = chunk["pos"].to_numpy().astype(np.int64)
+    end = start + chunk["len"].to_numpy().astype(np.int64)
+
+    def cells(layer, rows, win, value):
+        return pd.DataFrame({"layer": layer, "chr": chrom[rows], "period": period[rows], "win": win, "value": value})
+
+    every = np.arange(len(chunk))
+    row, win, bp = _repeat_windows(start, end, base)
+    parts = [cells("first", every, start // base, 1.0),
+             cells("last", every, end // base, 1.0),
+             cells("coverage", row, win, bp.astype(float))]
+    # Extra layers sum a per-repeat value in the window the repeat starts in; the
+    # matching '<name>_n' layer counts the repeats with a finite value
+    for name, (_, func) in extra.items():
+        values = np.asarray(func(chunk), dtype=float)
+        ok = np.flatnonzero(np.isfinite(values))
+        parts.append(cells(name, ok, start[ok] // base, values[ok]))
+        parts.append(cells(f"{name}_n", ok, start[ok] // base, 1.0))
+    return pd.concat(parts, ignore_index=True).groupby(["layer", "chr", "period", "win"], sort=False)["value"].sum()
+
+class DensityPyramid:
+    """
+    Per-chromosome, per-period window sums of an ULTRA table at several resolutions.
+
+    Layers, each a sparse (track, window, value) triple per level, where a track is
+    one (chromosome, period) pair:
+    - first / last: repeats whose first / last window (start // w, end // w) is this one.
+      Both reduce exactly to coarser windows, and "count" density is their running
+      difference, so counts at every level match window_density().
+    - coverage: bp covered per window.
+    - extra layers (e.g. GC content per repeat), summed in each repeat's start window.
+
+        pyramid = DensityPyramid.load("sample.tsv") or DensityPyramid.build("sample.tsv").save()
+        density = pyramid.window_density(["Gm01"], [91, 92], 500_000, chrom_lengths={"Gm01": 56_000_000})
+
+    Saved as <input>.density.npz with the size and mtime of the input; load() returns
+    None once the input changes.
+    """
+
+    def __init__(self, source, chroms, periods, base, factors, cells):
+        self.source = source
+        self.chroms = [str(c) for c in chroms]
+        self.periods = np.asarray(periods, dtype=np.int64)
+        self.base = int(base)
+        self.factors = sorted(int(f) for f in factors)
+        self.cells = cells  # {(layer, factor): (track, window, value)}
+        self.layers = sorted({layer for layer, _ in cells})
+
+    @classmethod
+    def build(cls, path, base=DEFAULT_BASE, factors=DEFAULT_FACTORS, extra=None, cache=True, chunksize=None):
+        """
+        Scan an ULTRA table once (in row chunks) and aggregate every level.
+        Arguments:
+        - path: ULTRA table (any layout read_ultra accepts).
+        - base: Finest window in bp; later queries need multiples of it.
+        - factors: Levels to store, as multiples of base (1 is always included).
+        - extra: {layer name: (columns, func)}; func(chunk) returns one value per repeat,
+          computed from the listed canonical columns.
+        - cache, chunksize: As for ultra_io.iter_ultra_chunks.
+        """
+        extra = extra or {}
+        columns = ["chr", "pos", "len", "period"]
+        for extra_columns, _ in extra.values():
+            columns += [c for c in extra_columns if c not in columns]
+        parts = [_chunk_cells(chunk, base, extra)
+                 for chunk in iter_ultra_chunks(path, columns=columns, chunksize=chunksize or DEFAULT_CHUNK_ROWS,
+                                                cache=cache)]
+        if parts:
+            base_cells = pd.concat(parts).groupby(level=[0, 1, 2, 3], sort=False).sum().reset_index()
+        else:
+            base_cells = pd.DataFrame({"layer": [], "chr": [], "period": [], "win": [], "value": []})
+
+        chroms = sorted(base_cells["chr"].astype(str).unique())
+        periods = np.sort(base_cells["period"].unique()).astype(np.int64)
+        track = (pd.Categorical(base_cells["chr"].astype(str), categories=chroms).codes.astype(np.int64) * len(periods)
+                 + np.searchsorted(periods, base_cells["period"].to_numpy()))
+        win = base_cells["win"].to_numpy().astype(np.int64)
+        value = base_cells["value"].to_numpy()
+        layer = base_cells["layer"].to_numpy()
+
+        cells = {}
+        for name in [*("first", "last", "coverage"), *[n for e in extra for n in (e, f"{e}_n")]]:
+            sel = layer == name
+            for factor in sorted(set(factors) | {1}):
+                # Coarser level: sum the base windows falling into each coarse window
+                level = pd.DataFrame({"track": track[sel], "win": win[sel] // factor, "value": value[sel]})
+                level = level.groupby(["track", "win"], sort=True)["value"].sum()
+                cells[(name, factor)] = (level.index.get_level_values(0).to_numpy(np.int64),
+                                         level.index.get_level_values(1).to_numpy(np.int64),
+                                         level.to_numpy(np.float64))
+        return cls(source_key(path), chroms, periods, base, sorted(set(factors) | {1}), cells)
+
+    @classmethod
+    def load(cls, path):
+        """Return the saved pyramid of path if it exists and the input is unchanged, else None."""
+        try:
+            with np.load(pyramid_path(path), allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != PYRAMID_VERSION or meta.get("source") != source_key(path):
+                    return None
+                cells = {}
+                for layer in meta["layers"]:
+                    for factor in meta["factors"]:
+                        key = f"{layer}@{factor}"
+                        cells[(layer, factor)] = (data[f"{key}:track"], data[f"{key}:win"], data[f"{key}:value"])
+                return cls(meta["source"], list(data["chroms"]), data["periods"], meta["base"], meta["factors"], cells)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, path=None):
+        """Write the pyramid to <input>.density.npz (next to the input it was built from); returns self."""
+        target = pyramid_path(path or self.source["path"])
+        meta = {"version": PYRAMID_VERSION, "source": self.source, "base": self.base,
+                "factors": self.factors, "layers": self.layers}
+        arrays = {"meta": np.array(json.dumps(meta)), "chroms": np.array(self.chroms, dtype=str),
+                  "periods": self.periods}
+        for (layer, factor), (track, win, value) in self.cells.items():
+            key = f"{layer}@{factor}"
+            arrays.update({f"{key}:track": track, f"{key}:win": win, f"{key}:value": value})
+        tmp = f"{target}.tmp{os.getpid()}"
+        with open(tmp, "wb") as fh:
+            np.savez_compressed(fh, **arrays)
+        os.replace(tmp, target)
+        return self
+
+    def supports(self, window_size, layers=()):
+        """True if window_size is a multiple of the base window and every named layer is stored."""
+        return window_size > 0 and window_size % self.base == 0 and all(l in self.layers for l in layers)
+
+    def _level(self, layer, window_size):
+        """Cells of the coarsest stored level dividing window_size, and how many of its windows make one."""
+        if not self.supports(window_size, [layer]):
+            raise ValueError(f"Window size {window_size} is not a multiple of the pyramid base {self.base} "
+                             f"or layer {layer!r} is not stored.")
+        factor = max(f for f in self.factors if (window_size // self.base) % f == 0)
+        return self.cells[(layer, factor)], window_size // (self.base * factor)
+
+    def _grid(self, layer, window_size, chromosomes, classes, n_cols):
+        """Dense (chromosomes, classes, n_cols) sums of a layer at window_size; windows past n_cols are dropped."""
+        (track, win, value), step = self._level(layer, window_size)
+        # Map stored chromosomes and periods to rows/columns of the requested grid (-1: not requested)
+        row_of_chrom = np.full(len(self.chroms), -1, dtype=np.int64)
+        for i, c in enumerate(chromosomes):
+            if c in self.chroms:
+                row_of_chrom[self.chroms.index(c)] = i
+        col_of_period = np.full(len(self.periods), -1, dtype=np.int64)
+        for j, p in enumerate(classes):
+            k = np.searchsorted(self.periods, p)
+            if k < len(self.periods) and self.periods[k] == p:
+                col_of_period[k] = j
+
+        n_periods = max(len(self.periods), 1)
+        row = row_of_chrom[track // n_periods]
+        col = col_of_period[track % n_periods]
+        coarse = win // step
+        keep = (row >= 0) & (col >= 0) & (coarse < n_cols)
+        flat = (row[keep] * len(classes) + col[keep]) * n_cols + coarse[keep]
+        size = len(chromosomes) * len(classes) * n_cols
+        return np.bincount(flat, weights=value[keep], minlength=size).reshape(len(chromosomes), len(classes), n_cols)
+
+    def window_density(self, chromosomes, classes, window_size, chrom_lengths, mode="count"):
+        """
+        Same result as window_density(df, ...) for the table the pyramid was built
+        from, with classes being periods. chrom_lengths is required here, since the
+        repeat starts themselves are no longer at hand.
+        """
+        if mode not in DENSITY_MODES:
+            raise ValueError(f"Unknown density mode {mode!r}; expected one of {', '.join(DENSITY_MODES)}.")
+        chromosomes = [str(c) for c in chromosomes]
+        lengths = {str(c): int(v) for c, v in chrom_lengths.items() if pd.notna(v)}
+        last = np.array([n_windows(lengths.get(c, 0), window_size) - 1 for c in chromosomes], dtype=np.int64)
+        n_win = int(last.max()) + 1 if len(chromosomes) else 0
+        if mode == "count":
+            # Repeats touching window w: first window <= w, minus those whose last window < w
+            first = self._grid("first", window_size, chromosomes, classes, n_win)
+            ended = self._grid("last", window_size, chromosomes, classes, n_win)
+            density = np.cumsum(first, axis=2) - np.cumsum(ended, axis=2) + ended
+        else:
+            density = self._grid("coverage", window_size, chromosomes, classes, n_win)
+        density = np.rint(density).astype(np.int64)
+        # Windows past each chromosome's end stay zero, as in window_density()
+        density *= (np.arange(n_win)[np.newaxis, :] <= last[:, np.newaxis])[:, np.newaxis, :]
+        return density
+
+    def bin_sums(self, layer, window_size, chroms=None, periods=None):
+        """
+        Sums of a layer per window_size bin, pooled over the selected chromosomes and
+        periods (all by default). Returns a Series indexed by bin start (bp), only
+        bins holding cells.
+        """
+        (track, win, value), step = self._level(layer, window_size)
+        n_periods = max(len(self.periods), 1)
+        keep = np.ones(len(track), dtype=bool)
+        if chroms is not None:
+            wanted = {str(c) for c in chroms}
+            keep &= np.isin(track // n_periods, [k for k, c in enumerate(self.chroms) if c in wanted])
+        if periods is not None:
+            keep &= np.isin(self.periods[track % n_periods], np.asarray(periods))
+        sums = pd.Series(value[keep]).groupby(win[keep] // step).sum()
+        sums.index = pd.Index(sums.index.to_numpy(np.int64) * window_size, name="bin")
+        return sums
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Precompute the multi-resolution density pyramid of ULTRA tables.",
+        epilog="""
+Example:
+    python ultra_density.py results/sample.tsv
+    python ultra_density.py --base 50000 --factors 1 2 20 results/*.tsv
+
+For each input F the pyramid F.density.npz is (re)built. Ideograms of F at any
+window size that is a multiple of the base window then read it instead of
+recomputing density from the table.
+""",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("ultra_files", nargs="+", help="ULTRA table(s) or ULTRA JSON file(s).")
+    parser.add_argument("--base", type=int, default=DEFAULT_BASE,
+                        help=f"Finest window in bp. Default: {DEFAULT_BASE:,}.")
+    parser.add_argument("--factors", type=int, nargs="+", default=list(DEFAULT_FACTORS),
+                        help="Levels to store, as multiples of the base window. Default: 1 10 100.")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Rows per chunk while scanning the table. Default: ultra_io.DEFAULT_CHUNK_ROWS.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse the ULTRA text instead of using (or creating) the <file>.parquet cache.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    for ultra_file in args.ultra_files:
+        pyramid = DensityPyramid.build(ultra_file, args.base, args.factors, cache=not args.no_cache,
+                                       chunksize=args.chunksize).save()
+        levels = ", ".join(f"{pyramid.base * f:,}" for f in pyramid.factors)
+        print(f"{pyramid_path(ultra_file)}: {len(pyramid.chroms)} sequences, {len(pyramid.periods)} periods, "
+              f"windows {levels} bp", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,931 @@
+#!/usr/bin/env python3
+"""
+ultra_io
+
+Shared loader for ULTRA tandem-repeat tables, used by get_GCcontent.py,
+ultra_plot_hist.py, Repeat_density_ideograms_using_ULTRA_result.v2.py,
+DRAFT_aln_trim_by_ML_feature_class.py and the centromeric peak agent.
+
+Two layouts are recognised from the first line of the file:
+- JSON-derived TSV (ultra2tsv.v1.sh): no header, 10 columns
+  SequenceName Start Length Period Score Substitutions Insertions Deletions Consensus Sequence
+- Native ULTRA TSV: header line "SeqID Start End Period Score Consensus #Subrepeats ...";
+  len is derived as End - Start.
+
+Tables always come back with the canonical column names
+
+    chr, pos, len, period, score, sub, ins, del, cons, seq
+
+and compact dtypes (categorical chr, int32 coordinates/counts, float32 score).
+Use columns= to load only what a script needs; e.g. columns=["period"] never
+materialises the Consensus/Sequence strings. pyarrow is used as the CSV engine
+when it is installed, the pandas C engine otherwise. gzip input is read directly.
+
+Columnar cache: when pyarrow is installed, read_ultra() keeps a sidecar
+directory <input>.parquet/ with one Parquet file per column, rows in input
+order, plus a manifest.json. The manifest records the source path, size and
+mtime and a hash of the parse options; the cache is used while all of those
+still match and rebuilt otherwise. Only the requested columns (plus chr, pos
+and period) are parsed into it; other columns are added the first time a read
+asks for them. Row groups of 65536 rows are shared by all columns, and the
+manifest lists the chromosomes and period/start ranges of each, so chroms=,
+period= and start= skip whole row groups before the exact filter runs on the
+rest. Cached and text reads return the same rows in the same (input) order.
+Without pyarrow (or with cache=False) the text is parsed every time and the
+same filters are applied in memory.
+
+JSON filter criteria ({"chr": "Gm15", "score": [">", 10], ...}) compile to a
+single mask with CompiledFilter, which also turns chr/period/pos conditions into
+read_ultra() pushdown arguments.
+
+ULTRA JSON output can be passed anywhere a TSV is accepted: it is streamed
+into the same cache by ultra_json.py (keeping the subrepeat arrays as the
+optional 'subrepeats' column), so no intermediate TSV is needed.
+
+Scripts in bin/ import it directly; scripts elsewhere add bin/ to sys.path first:
+
+    from ultra_io import read_ultra
+    df = read_ultra("repeats.tsv", columns=["chr", "len", "period"])
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+from fasta_io import is_gzip, open_fasta
+
+ULTRA_COLUMNS = ["chr", "pos", "len", "period", "score", "sub", "ins", "del", "cons", "seq"]
+
+ULTRA_DTYPES = {
+    "chr": "category",
+    "pos": "int32",
+    "len": "int32",
+    "end": "int32",
+    "period": "int32",
+    "score": "float32",
+    "sub": "int32",
+    "ins": "int32",
+    "del": "int32",
+    "cons": "object",
+    "seq": "object",
+    "subrepeats": "object",
+}
+
+# Extra columns only some inputs carry; never loaded unless asked for by name
+ULTRA_OPTIONAL_COLUMNS = ["subrepeats"]
+
+# Header names (after normalize_column_name) accepted for each canonical column in headered tables
+HEADER_ALIASES = {
+    "seqid": "chr", "sequencename": "chr", "sequence_name": "chr", "chr": "chr", "chrom": "chr",
+    "start": "pos", "pos": "pos",
+    "end": "end",
+    "length": "len", "len": "len",
+    "period": "period", "period_bp": "period", "repeat_period": "period",
+    "motif_period": "period", "monomer_size": "period", "monomer_size_bp": "period",
+    "score": "score",
+    "substitutions": "sub", "sub": "sub",
+    "insertions": "ins", "ins": "ins",
+    "deletions": "del", "del": "del",
+    "consensus": "cons", "cons": "cons",
+    "sequence": "seq", "seq": "seq",
+}
+
+def normalize_column_name(name):
+    """Normalize a header name for matching, e.g. '#Subrepeats' -> 'subrepeats', 'Period' -> 'period'."""
+    return str(name).strip().lstrip("#").lower().replace(" ", "_").replace("-", "_")
+
+def detect_layout(path):
+    """
+    Sniff the first non-blank line of an ULTRA table.
+    Returns:
+    - (layout, sep, fields): layout is 'json' (headerless JSON-derived columns),
+      'native' (headered) or 'ultra_json' (ULTRA's JSON output itself, see ultra_json.py),
+      sep is the field delimiter and fields the fields of that line.
+    """
+    with open_fasta(path, "rt") as fh:
+        for line in fh:
+            if line.strip():
+                break
+        else:
+            raise ValueError(f"{path} is empty.")
+
+    if line.lstrip()[:1] in ("{", "["):
+        return "ultra_json", None, []
+
+    sep = "\t" if "\t" in line else r"\s+"
+    fields = line.rstrip("\r\n").split("\t") if sep == "\t" else line.split()
+    # Headerless tables start with data, so the second field (Start) is an integer
+    if len(fields) > 1 and fields[1].strip().lstrip("-").isdigit():
+        return "json", sep, fields
+    return "native", sep, fields
+
+def is_ultra_json(path):
+    """True if path holds ULTRA JSON output rather than a TSV."""
+    return detect_layout(path)[0] == "ultra_json"
+
+def _default_engine(sep):
+    if len(sep) == 1:
+        try:
+            import pyarrow  # noqa: F401
+            return "pyarrow"
+        except ImportError:
+            pass
+    return "c"
+
+def coerce_column(series, dtype):
+    """Loose numeric conversion used when a column does not parse cleanly as its compact dtype."""
+    values = pd.to_numeric(series, errors="coerce")
+    if dtype == "int32" and values.notna().all() and (values % 1 == 0).all():
+        return values.astype("int32")
+    if dtype == "float32":
+        return values.astype("float32")
+    return values  # float64 keeps large coordinates exact alongside NaN
+
+def check_columns(columns):
+    """Return columns as a list (all ULTRA_COLUMNS when None), rejecting unknown names."""
+    wanted = list(ULTRA_COLUMNS) if columns is None else list(columns)
+    unknown = [c for c in wanted if c not in ULTRA_COLUMNS + ULTRA_OPTIONAL_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown ULTRA column(s) {unknown}; expected a subset of "
+                         f"{ULTRA_COLUMNS + ULTRA_OPTIONAL_COLUMNS}.")
+    return wanted
+
+def _text_plan(path, wanted):
+    """
+    Work out how to parse the text columns needed for the canonical columns in wanted.
+    Returns a dict with the read_csv options, the columns to load and whether len is derived.
+    """
+    layout, sep, fields = detect_layout(path)
+    if layout == "ultra_json":
+        raise ValueError(f"{path} is ULTRA JSON, not a TSV; read it with read_ultra() or ultra_json.py.")
+    if layout == "json":
+        source = {name: i for i, name in enumerate(ULTRA_COLUMNS[:len(fields)])}
+        header = None
+    else:
+        source = {}
+        for i, name in enumerate(fields):
+            canonical = HEADER_ALIASES.get(normalize_column_name(name))
+            if canonical is not None:
+                source.setdefault(canonical, i)
+        header = 0
+
+    load = [c for c in wanted if c in source]
+    derive_len = "len" in wanted and "len" not in source and "pos" in source and "end" in source
+    if derive_len:
+        load += [c for c in ("pos", "end") if c not in load]
+    if not load:
+        raise ValueError(f"None of the columns {wanted} were found in {path} (first line: {fields}).")
+
+    # Name every field so pandas never mistakes surplus columns (e.g. a trailing tab) for an index
+    names = [f"_{i}" for i in range(len(fields))]
+    for canonical, i in source.items():
+        names[i] = canonical
+
+    options = dict(sep=sep, header=header, names=names, usecols=sorted(source[c] for c in load),
+                   compression="gzip" if is_gzip(path) else None)
+    return {"options": options, "load": load, "derive_len": derive_len, "sep": sep}
+
+def _finish_text_frame(df, plan, wanted):
+    """Shared post-processing of a parsed text frame (or chunk): chr category, derived len, projection."""
+    if "chr" in df.columns and not isinstance(df["chr"].dtype, pd.CategoricalDtype):
+        df["chr"] = df["chr"].astype("category")
+    if plan["derive_len"]:
+        df["len"] = df["end"] - df["pos"]
+    keep = [c for c in wanted if c in df.columns]
+    return df if list(df.columns) == keep else df[keep]
+
+def _loose_text_dtype(load):
+    return {c: t for c, t in ULTRA_DTYPES.items() if c in load and t in ("object", "category")}
+
+def parse_ultra_text(path, columns=None, engine=None):
+    """
+    Parse an ULTRA table (either layout, plain or gzip) from text, bypassing the cache.
+    Arguments:
+    - path: ULTRA TSV file.
+    - columns: Canonical columns to load (default: all of ULTRA_COLUMNS). Columns the
+      layout does not carry (sub/ins/del/seq in native output) are left out of the result.
+    - engine: pandas CSV engine ('pyarrow' or 'c'); default pyarrow when installed.
+    Returns:
+    - DataFrame with the requested canonical columns, in the order requested.
+    """
+    wanted = check_columns(columns)
+    plan = _text_plan(path, wanted)
+    load, options = plan["load"], plan["options"]
+
+    engine = engine or _default_engine(plan["sep"])
+    dtype = {c: ULTRA_DTYPES[c] for c in load}
+    if engine == "pyarrow":
+        dtype = {c: t for c, t in dtype.items() if t != "category"}  # categorised after parsing
+
+    try:
+        df = pd.read_csv(path, dtype=dtype, engine=engine, **options)
+    except (ValueError, TypeError):
+        # Blank or non-integer values somewhere in a numeric column: parse loosely, then coerce
+        text_dtype = _loose_text_dtype(load)
+        df = pd.read_csv(path, dtype=text_dtype, engine="c", **options)
+        for c in load:
+            if c not in text_dtype:
+                df[c] = coerce_column(df[c], ULTRA_DTYPES[c])
+
+    return _finish_text_frame(df, plan, wanted)
+
+def _iter_text_chunks(path, wanted, chunksize):
+    """Parse the text in chunks of chunksize rows (C engine; numeric columns coerced per chunk)."""
+    plan = _text_plan(path, wanted)
+    text_dtype = _loose_text_dtype(plan["load"])
+    text_dtype = {c: ("object" if t == "category" else t) for c, t in text_dtype.items()}
+    with pd.read_csv(path, dtype=text_dtype, engine="c", chunksize=chunksize, **plan["options"]) as reader:
+        for chunk in reader:
+            for c in plan["load"]:
+                if c not in text_dtype:
+                    chunk[c] = coerce_column(chunk[c], ULTRA_DTYPES[c])
+            yield _finish_text_frame(chunk.reset_index(drop=True), plan, wanted)
+
+# ---------- Columnar cache ----------
+CACHE_VERSION = 3
+CACHE_ROW_GROUP = 65536  # rows per Parquet row group; the unit chroms/period/start pushdown can skip
+
+# Always cached, whatever the first caller asked for: they carry the row-group statistics
+CACHE_BASE_COLUMNS = ["chr", "pos", "period"]
+
+def cache_dir(path):
+    return f"{path}.parquet"
+
+def column_file(path, column):
+    """Path of one column's Parquet file in the cache of path."""
+    return os.path.join(cache_dir(path), f"col-{column}.parquet")
+
+def _options_hash():
+    """Hash of everything that changes how text is parsed into the cached columns."""
+    options = {"version": CACHE_VERSION, "columns": ULTRA_COLUMNS, "dtypes": ULTRA_DTYPES, "aliases": HEADER_ALIASES}
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode()).hexdigest()
+
+def source_key(path):
+    """Identity of the input file (absolute path, size, mtime) that caches are validated against."""
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _read_manifest(path):
+    """Return the cache manifest for path if the cache exists and is still valid, else None."""
+    manifest_file = os.path.join(cache_dir(path), "manifest.json")
+    try:
+        with open(manifest_file) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("source") != source_key(path) or manifest.get("options") != _options_hash():
+        return None
+    return manifest
+
+def _write_manifest(directory, manifest):
+    tmp = os.path.join(directory, f"manifest.json.tmp{os.getpid()}")
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(tmp, os.path.join(directory, "manifest.json"))
+
+def _value_range(values):
+    """[min, max] of the finite values, or None if there are none."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    return [float(values.min()), float(values.max())] if values.size else None
+
+def group_stats(codes, period=None, pos=None):
+    """Row-group entry of the manifest: rows, chromosome codes present, period and start ranges."""
+    stats = {"rows": int(len(codes)), "chroms": np.unique(codes).tolist()}
+    for name, values in (("period", period), ("pos", pos)):
+        if values is not None:
+            stats[name] = _value_range(values)
+    return stats
+
+def _arrow_column(values):
+    import pyarrow as pa
+
+    if isinstance(values, pd.Series):
+        values = values.astype(object) if values.dtype.kind not in "biuf" else values.to_numpy()
+    return pa.array(values, from_pandas=True)
+
+def _write_column_file(file_name, column, values, row_group=CACHE_ROW_GROUP):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_arrays([_arrow_column(values)], names=[column])
+    pq.write_table(table, file_name, row_group_size=row_group)
+
+def _layout_columns(path):
+    """Canonical columns a text table can provide (len also when it is derived from End)."""
+    plan = _text_plan(path, ULTRA_COLUMNS)
+    return [c for c in ULTRA_COLUMNS if c in plan["load"] or (c == "len" and plan["derive_len"])]
+
+def write_cache(path, df, available=None):
+    """
+    Write a parsed table to the sidecar cache: one Parquet file per column, rows in input
+    order, row groups of CACHE_ROW_GROUP rows shared by all columns. The manifest keeps the
+    chromosome codes and period/start ranges of every row group, which is what the
+    chroms/period/start pushdown prunes on, so scaffold-heavy assemblies still make a few
+    large files. available lists the columns the source can provide (default: df's);
+    the others are added by add_cache_columns when first asked for.
+    The directory is built under a temporary name and swapped in, so readers never see a partial cache.
+    """
+    tmp = new_cache_tmp(path)
+    chrom = df["chr"]
+    if not isinstance(chrom.dtype, pd.CategoricalDtype):
+        chrom = chrom.astype(str).astype("category")
+    names = [str(c) for c in chrom.cat.categories]
+    codes = chrom.cat.codes.to_numpy().astype(np.int32)
+
+    columns = list(df.columns)
+    for c in columns:
+        values = codes if c == "chr" else df[c]
+        _write_column_file(os.path.join(tmp, os.path.basename(column_file(path, c))), c, values)
+
+    groups = []
+    for lo in range(0, len(df), CACHE_ROW_GROUP):
+        hi = lo + CACHE_ROW_GROUP
+        groups.append(group_stats(codes[lo:hi],
+                                  df["period"].to_numpy()[lo:hi] if "period" in df.columns else None,
+                                  df["pos"].to_numpy()[lo:hi] if "pos" in df.columns else None))
+    return finish_cache(path, tmp, columns, names, groups, available or columns)
+
+def add_cache_columns(path, manifest, df):
+    """Add the columns of df (the whole table, input order) to an existing cache; returns the manifest."""
+    if len(df) != manifest["rows"]:
+        raise ValueError(f"{path}: {len(df)} rows parsed but the cache holds {manifest['rows']}.")
+    for c in df.columns:
+        file_name = column_file(path, c)
+        tmp = f"{file_name}.tmp{os.getpid()}"
+        _write_column_file(tmp, c, df[c])
+        os.replace(tmp, file_name)
+    manifest = dict(manifest, columns=manifest["columns"] + [c for c in df.columns if c not in manifest["columns"]])
+    _write_manifest(cache_dir(path), manifest)
+    return manifest
+
+def new_cache_tmp(path):
+    """Create (empty) the temporary directory a cache is built in before finish_cache swaps it in."""
+    tmp = f"{cache_dir(path)}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    return tmp
+
+def finish_cache(path, tmp, columns, chroms, groups, available):
+    """
+    Write the manifest into a fully built temporary cache directory and swap it in.
+    chroms names the chromosome codes stored in col-chr; groups holds one group_stats()
+    entry per row group; available lists every column the source can provide.
+    """
+    manifest = {"source": source_key(path), "options": _options_hash(),
+                "rows": sum(g["rows"] for g in groups), "columns": list(columns),
+                "available": list(available), "chroms": list(chroms), "groups": groups}
+    _write_manifest(tmp, manifest)
+
+    target = cache_dir(path)
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(tmp, target)
+    return manifest
+
+def _ensure_cached(path, manifest, wanted, engine=None):
+    """
+    Build the cache of a text table, or add the wanted columns it lacks. Only the wanted
+    and base columns are parsed, so a first read of ["period"] never touches the sequences.
+    """
+    if manifest is None:
+        available = _layout_columns(path)
+        build = [c for c in available if c in wanted or c in CACHE_BASE_COLUMNS]
+        return write_cache(path, parse_ultra_text(path, columns=build, engine=engine), available)
+    missing = [c for c in wanted if c in manifest["available"] and c not in manifest["columns"]]
+    if missing:
+        manifest = add_cache_columns(path, manifest, parse_ultra_text(path, columns=missing, engine=engine))
+    return manifest
+
+def _cache_has(manifest, wanted):
+    return all(c in manifest["columns"] for c in wanted if c in manifest["available"])
+
+def _chrom_matches(name, chroms):
+    return chroms(name) if callable(chroms) else name in chroms
+
+def _select_groups(manifest, chroms, period, start):
+    """Row groups whose statistics can hold rows matching every filter."""
+    codes = None
+    if chroms is not None:
+        codes = {k for k, name in enumerate(manifest["chroms"]) if _chrom_matches(name, chroms)}
+    selected = []
+    for g, stats in enumerate(manifest["groups"]):
+        if codes is not None and codes.isdisjoint(stats["chroms"]):
+            continue
+        ok = True
+        for column, bounds in (("period", period), ("pos", start)):
+            if bounds is None or column not in stats:
+                continue
+            lo, hi = bounds
+            span = stats[column]
+            if span is None or (lo is not None and span[1] < lo) or (hi is not None and span[0] > hi):
+                ok = False
+        if ok:
+            selected.append(g)
+    return selected
+
+def _chrom_categorical(codes, names):
+    """col-chr codes as the categorical text parsing gives (categories sorted by name)."""
+    chrom = pd.Categorical.from_codes(codes, categories=names)
+    if names != sorted(names):
+        chrom = chrom.reorder_categories(sorted(names))
+    return chrom
+
+def _empty_frame(columns):
+    return pd.DataFrame({c: pd.Series(dtype=ULTRA_DTYPES[c]) for c in columns})
+
+def _read_cache_groups(manifest, path, columns, groups):
+    """The given columns of the given row groups, as one DataFrame in input order."""
+    import pyarrow.parquet as pq
+
+    whole = len(groups) == len(manifest["groups"])
+    data = {}
+    for c in columns:
+        source = pq.ParquetFile(column_file(path, c))
+        table = source.read(columns=[c]) if whole else source.read_row_groups(groups, columns=[c])
+        values = table.column(0).to_pandas()
+        if c == "chr":
+            values = _chrom_categorical(values.to_numpy(), manifest["chroms"])
+        elif ULTRA_DTYPES[c] == "object" and values.dtype != object:
+            values = values.astype(object)  # as text parsing returns them
+        data[c] = values
+    return pd.DataFrame(data)
+
+def _iter_cache_parts(manifest, path, wanted, chroms, period, start, batch_size=None):
+    """
+    Yield DataFrames of at most batch_size rows (default: one frame) from the cache, in input
+    order. Row groups are skipped on their manifest statistics and the filters applied exactly
+    to the rows of the others.
+    """
+    batch_size = batch_size or max(manifest["rows"], 1)
+    available = [c for c in wanted if c in manifest["columns"]]
+    filtered = chroms is not None or period is not None or start is not None
+    extra = [c for c, used in (("chr", chroms), ("period", period), ("pos", start))
+             if used is not None and c not in available]
+    groups = _select_groups(manifest, chroms, period, start)
+
+    run, run_rows = [], 0
+    for i, g in enumerate(groups):
+        run.append(g)
+        run_rows += manifest["groups"][g]["rows"]
+        if run_rows < batch_size and i + 1 < len(groups):
+            continue
+        part = _read_cache_groups(manifest, path, available + extra, run)
+        run, run_rows = [], 0
+        if filtered:
+            part = _apply_filters(part, chroms, period, start)
+        for lo in range(0, len(part), batch_size):
+            piece = part.iloc[lo:lo + batch_size].reset_index(drop=True)
+            yield piece.drop(columns=extra) if extra else piece
+
+def _read_cache(manifest, path, wanted, chroms, period, start):
+    parts = list(_iter_cache_parts(manifest, path, wanted, chroms, period, start))
+    if not parts:
+        available = [c for c in wanted if c in manifest["columns"]]
+        df = _empty_frame(available)
+        if "chr" in available:
+            df["chr"] = pd.Categorical([], categories=sorted(manifest["chroms"]))
+        return df
+    return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+def _apply_filters(df, chroms, period, start):
+    """In-memory filters, for text-parsed tables and for the rows of the cache's selected row groups."""
+    mask = pd.Series(True, index=df.index)
+    if chroms is not None:
+        keep = [c for c in df["chr"].cat.categories if _chrom_matches(c, chroms)]
+        mask &= df["chr"].isin(keep)
+    for column, bounds in (("period", period), ("pos", start)):
+        if bounds is None:
+            continue
+        lo, hi = bounds
+        if lo is not None:
+            mask &= df[column] >= lo
+        if hi is not None:
+            mask &= df[column] <= hi
+    return df if mask.all() else df[mask].reset_index(drop=True)
+
+def _build_json_cache(path):
+    """Stream ULTRA JSON straight into the cache; None (after a warning) if it cannot be written."""
+    from ultra_json import json_to_cache
+
+    try:
+        return json_to_cache(path)
+    except OSError as e:
+        print(f"Warning: could not write cache {cache_dir(path)} ({e}); parsing JSON.", file=sys.stderr)
+        return None
+
+def _pyarrow_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def read_ultra(path, columns=None, engine=None, chroms=None, period=None, start=None, cache=True):
+    """
+    Read an ULTRA table into a DataFrame, through the columnar cache when possible.
+    Arguments:
+    - path: ULTRA TSV file (either layout, plain or gzip), or ULTRA JSON output.
+    - columns: Canonical columns to return (default: all the layout provides).
+    - engine: CSV engine for text parsing; see parse_ultra_text.
+    - chroms: Chromosome names to keep, or a predicate called with each name.
+    - period: (min, max) inclusive period range; either bound may be None.
+    - start: (min, max) inclusive range on the repeat start (pos); either bound may be None.
+    - cache: Use (and create) the <path>.parquet sidecar. Ignored when pyarrow is missing.
+    Returns:
+    - DataFrame with the requested canonical columns, rows in input order either way.
+    """
+    wanted = check_columns(columns)
+    filtered = chroms is not None or period is not None or start is not None
+
+    json_input = is_ultra_json(path)
+
+    if cache and _pyarrow_available():
+        manifest = _read_manifest(path)
+        if manifest is None and json_input:
+            manifest = _build_json_cache(path)
+        elif not json_input:
+            try:
+                manifest = _ensure_cached(path, manifest, wanted, engine)
+            except OSError as e:
+                print(f"Warning: could not write cache {cache_dir(path)} ({e}); parsing text.", file=sys.stderr)
+                manifest = None
+        if manifest is not None:
+            return _read_cache(manifest, path, wanted, chroms, period, start)
+
+    # Filter columns must be loaded even if the caller did not ask for them
+    extra = [c for c, used in (("chr", chroms), ("period", period), ("pos", start)) if used is not None and c not in wanted]
+    if json_input:
+        from ultra_json import read_ultra_json
+        df = read_ultra_json(path, columns=wanted + extra)
+    else:
+        df = parse_ultra_text(path, columns=wanted + extra, engine=engine)
+    if filtered:
+        df = _apply_filters(df, chroms, period, start)
+    return df.drop(columns=extra) if extra else df
+
+# ---------- Chunked (out-of-core) access ----------
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+def _chrom_runs(chunks):
+    """Regroup row chunks into one DataFrame per consecutive run of the same chromosome."""
+    pending = []
+    current = None
+    for chunk in chunks:
+        chrom = chunk["chr"].astype(str).to_numpy()
+        if len(chrom) == 0:
+            continue
+        bounds = [0, *(np.flatnonzero(chrom[1:] != chrom[:-1]) + 1), len(chrom)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if current is not None and chrom[lo] != current:
+                yield _concat_run(pending)
+                pending = []
+            current = chrom[lo]
+            pending.append(chunk.iloc[lo:hi])
+    if pending:
+        yield _concat_run(pending)
+
+def _concat_run(parts):
+    run = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+    run["chr"] = run["chr"].astype(str).astype("category")
+    return run
+
+def iter_ultra_chunks(path, columns=None, chunksize=DEFAULT_CHUNK_ROWS, by="rows",
+                      chroms=None, period=None, start=None, cache=True):
+    """
+    Iterate over an ULTRA table in pieces so memory is bounded by the piece, not the file.
+    Arguments:
+    - path, columns, chroms, period, start, cache: As for read_ultra.
+    - chunksize: Maximum rows per chunk when by='rows'.
+    - by: 'rows' for fixed-size row chunks, or 'chr' for one DataFrame per consecutive
+      run of a chromosome (one per chromosome, as ULTRA writes them).
+    Yields:
+    - DataFrames with the requested canonical columns, in input order. Empty chunks are skipped.
+
+    A valid <path>.parquet cache holding the columns is read row group by row group with
+    the filters pushed down. Otherwise the text is streamed with the C engine; the cache
+    is not built or extended here, since that parses whole columns (read_ultra does it).
+    ULTRA JSON input is the exception: its ingestion streams, so the cache is built
+    on first use and then read.
+    """
+    if by not in ("rows", "chr"):
+        raise ValueError(f"by must be 'rows' or 'chr', got {by!r}")
+    wanted = check_columns(columns)
+
+    # Columns needed to filter or group must be read even if the caller did not ask for them
+    needed = {"chr": chroms is not None or by == "chr", "period": period is not None, "pos": start is not None}
+    extra = [c for c, used in needed.items() if used and c not in wanted]
+    filtered = chroms is not None or period is not None or start is not None
+
+    json_input = is_ultra_json(path)
+    manifest = _read_manifest(path) if cache and _pyarrow_available() else None
+    if manifest is None and json_input and cache and _pyarrow_available():
+        manifest = _build_json_cache(path)  # ingestion streams, so this stays out-of-core
+    if manifest is not None and _cache_has(manifest, wanted + extra):
+        source = _iter_cache_parts(manifest, path, wanted + extra, chroms, period, start, chunksize)
+        filtered = False  # applied to the selected row groups already
+    elif json_input:
+        from ultra_json import iter_ultra_json_frames
+        source = iter_ultra_json_frames(path, wanted + extra, chunksize)
+    else:
+        source = _iter_text_chunks(path, wanted + extra, chunksize)
+
+    def chunks():
+        for chunk in source:
+            if filtered:
+                chunk = _apply_filters(chunk, chroms, period, start)
+            if len(chunk):
+                yield chunk
+
+    pieces = _chrom_runs(chunks()) if by == "chr" else chunks()
+    for piece in pieces:
+        yield piece.drop(columns=extra) if extra else piece
+
+def period_counts_path(path):
+    return f"{path}.periods.json"
+
+def _read_period_counts(path):
+    """Whole-table period counts saved next to path, if still valid, else None."""
+    try:
+        with open(period_counts_path(path)) as fh:
+            saved = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if saved.get("source") != source_key(path) or saved.get("options") != _options_hash():
+        return None
+    return pd.Series(np.asarray(saved["counts"], dtype=np.int64),
+                     index=pd.Index(np.asarray(saved["periods"], dtype=np.int64), name="period"), name="count")
+
+def _write_period_counts(path, counts):
+    saved = {"source": source_key(path), "options": _options_hash(),
+             "periods": counts.index.tolist(), "counts": counts.tolist()}
+    try:
+        with open(period_counts_path(path), "w") as fh:
+            json.dump(saved, fh)
+    except OSError as e:
+        print(f"Warning: could not write {period_counts_path(path)} ({e}).", file=sys.stderr)
+
+def count_periods(path, chroms=None, period=None, start=None, cache=True, chunksize=DEFAULT_CHUNK_ROWS):
+    """
+    Count repeats per (rounded) period, streaming the table in chunks.
+    With cache=True and no chroms/start filter, the counts of the whole table are
+    kept in <path>.periods.json (a few KB) and a period range is applied to them,
+    so later calls with any range do not read the table.
+    Returns:
+    - Series of counts indexed by period (ascending), only periods that occur.
+    """
+    if cache and chroms is None and start is None:
+        counts = _read_period_counts(path)
+        if counts is None:
+            counts = _scan_period_counts(path, None, None, None, cache, chunksize)
+            _write_period_counts(path, counts)
+        if period is not None:
+            lo, hi = period
+            keep = np.ones(len(counts), dtype=bool)
+            if lo is not None:
+                keep &= counts.index.to_numpy() >= lo
+            if hi is not None:
+                keep &= counts.index.to_numpy() <= hi
+            counts = counts[keep]
+        return counts
+    return _scan_period_counts(path, chroms, period, start, cache, chunksize)
+
+def _scan_period_counts(path, chroms, period, start, cache, chunksize):
+    counts = np.zeros(0, dtype=np.int64)
+    for chunk in iter_ultra_chunks(path, columns=["period"], chunksize=chunksize,
+                                   chroms=chroms, period=period, start=start, cache=cache):
+        values = chunk["period"].dropna().to_numpy()
+        if values.dtype.kind == "f":
+            values = np.rint(values)
+        values = values.astype(np.int64)
+        chunk_counts = np.bincount(values[values >= 0])
+        if len(chunk_counts) > len(counts):
+            counts = np.pad(counts, (0, len(chunk_counts) - len(counts)))
+        counts[:len(chunk_counts)] += chunk_counts
+
+    periods = np.flatnonzero(counts)
+    return pd.Series(counts[periods], index=pd.Index(periods, name="period"), name="count")
+
+# ---------- Filter criteria ----------
+def intersect_ranges(*ranges):
+    """Intersection of inclusive (min, max) ranges (None, or None bounds, mean unbounded); None if unbounded."""
+    lo, hi = None, None
+    for bounds in ranges:
+        if bounds is None:
+            continue
+        if bounds[0] is not None:
+            lo = bounds[0] if lo is None else max(lo, bounds[0])
+        if bounds[1] is not None:
+            hi = bounds[1] if hi is None else min(hi, bounds[1])
+    return None if lo is None and hi is None else (lo, hi)
+
+class CompiledFilter:
+    """
+    Row filter compiled from JSON filter criteria, evaluated as one boolean mask.
+
+    Criteria map a column to a condition:
+    - "text": keep rows whose (string) column contains text, literally.
+    - ["regex", pattern]: keep rows whose string column matches pattern.
+    - [">", v] / ["<", v] / ["between", lo, hi]: numeric conditions (between is inclusive).
+
+        row_filter = CompiledFilter({"seq_id": "Gm15", "period": ["between", 91, 92]},
+                                    aliases={"seq_id": "chr"})
+        df = df[row_filter.mask(df)]
+
+    String conditions on categorical columns are evaluated once per category.
+    Conditions on columns missing from the frame, string conditions on numeric
+    columns and numeric conditions on string columns are ignored. aliases maps the
+    criteria's column names to canonical ULTRA columns; conditions on chr, period
+    and pos then also become read_ultra() pushdown arguments (see pushdown()).
+    """
+
+    def __init__(self, criteria, aliases=None):
+        self.conditions = []
+        for column, condition in (criteria or {}).items():
+            if isinstance(condition, str):
+                self.conditions.append((column, "contains", (condition,)))
+            elif isinstance(condition, (list, tuple)) and condition and condition[0] in (">", "<", "between", "regex"):
+                op, args = condition[0], tuple(condition[1:])
+                if len(args) != (2 if op == "between" else 1):
+                    raise ValueError(f"Filter on {column!r}: {op!r} needs {2 if op == 'between' else 1} value(s).")
+                self.conditions.append((column, op, args))
+            else:
+                raise ValueError(f"Filter on {column!r}: unsupported condition {condition!r}.")
+        self.aliases = dict(aliases or {})
+
+    def __bool__(self):
+        return bool(self.conditions)
+
+    def _string_hits(self, series, op, pattern):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Test each category once and look the codes up
+            categories = series.cat.categories.astype(str)
+            if op == "contains":
+                hit = np.array([pattern in c for c in categories], dtype=bool)
+            else:
+                hit = pd.Series(categories).str.contains(pattern, regex=True).to_numpy(dtype=bool)
+            codes = series.cat.codes.to_numpy()
+            return np.append(hit, False)[codes]  # code -1 (missing) indexes the trailing False
+        return series.str.contains(pattern, regex=op == "regex", na=False).to_numpy(dtype=bool)
+
+    def mask(self, df):
+        """Boolean numpy array selecting the rows of df that satisfy every condition."""
+        mask = np.ones(len(df), dtype=bool)
+        for column, op, args in self.conditions:
+            if column not in df.columns:
+                continue
+            series = df[column]
+            numeric = pd.api.types.is_numeric_dtype(series)
+            if op in ("contains", "regex"):
+                if not numeric:
+                    mask &= self._string_hits(series, op, args[0])
+                continue
+            if not numeric:
+                continue
+            values = series.to_numpy()
+            if op == ">":
+                mask &= values > args[0]
+            elif op == "<":
+                mask &= values < args[0]
+            else:
+                mask &= (values >= args[0]) & (values <= args[1])
+        return mask
+
+    def pushdown(self, chroms=None, period=None, start=None):
+        """
+        read_ultra()/iter_ultra_chunks() chroms, period and start arguments implied by
+        the criteria, combined with the given ones. Ranges are inclusive, so strict
+        bounds are widened to inclusive ones: the pushdown may keep a few rows the mask
+        drops, never the reverse. Returns a dict of the three arguments.
+        """
+        ranges = {"period": [period], "pos": [start]}
+        tests = []
+        for column, op, args in self.conditions:
+            canonical = self.aliases.get(column, column)
+            if canonical in ranges:
+                bounds = {">": (args[0], None), "<": (None, args[0]), "between": args}.get(op)
+                if bounds is not None:
+                    ranges[canonical].append(bounds)
+            elif canonical == "chr" and op == "contains":
+                tests.append(args[0])
+        if tests:
+            base = chroms
+            chroms = lambda name: all(t in name for t in tests) and (base is None or _chrom_matches(name, base))
+        return {"chroms": chroms, "period": intersect_ranges(*ranges["period"]),
+                "start": intersect_ranges(*ranges["pos"])}
+
+# ---------- In-memory index ----------
+class UltraIndex:
+    """
+    Query index over a loaded ULTRA table.
+
+    Rows are ordered by chromosome, then period, then start. Offset tables give
+    the first row of every chromosome and of every (chromosome, period) group,
+    so a query such as "period 91-92 on Gm15 between 40-42 Mb" is a handful of
+    searchsorted calls and contiguous slices instead of full-table masks.
+    Building costs one lexsort; it pays off once several queries hit the same table.
+
+        index = UltraIndex(df)
+        sub = index.query(chroms=lambda c: "Gm15" in c, period=(91, 92), start=(40_000_000, 42_000_000))
+
+    Column names default to the canonical ones; scripts that rename them pass
+    chr_col/period_col/pos_col. The index refers to df; rebuild it if df changes.
+    """
+
+    def __init__(self, df, chr_col="chr", period_col="period", pos_col="pos"):
+        self.df = df
+        chrom = df[chr_col]
+        if not isinstance(chrom.dtype, pd.CategoricalDtype):
+            chrom = chrom.astype(str).astype("category")
+        self.chroms = [str(c) for c in chrom.cat.categories]
+
+        codes = chrom.cat.codes.to_numpy().astype(np.int64)
+        period = df[period_col].to_numpy()
+        pos = df[pos_col].to_numpy()
+        self.order = np.lexsort((pos, period, codes))
+        period = period[self.order]
+        pos = pos[self.order].astype(np.int64)
+        codes = codes[self.order]
+
+        # (chromosome, period) groups: first row of each, plus a sentinel at the end
+        n = len(self.order)
+        change = np.ones(n, dtype=bool)
+        if n:
+            change[1:] = (codes[1:] != codes[:-1]) | (period[1:] != period[:-1])
+        self._group_first = np.append(np.flatnonzero(change), n)
+        self._group_code = codes[change]
+        self._group_period = period[change]
+        # First group of every chromosome code (plus a sentinel)
+        self._chrom_first_group = np.searchsorted(self._group_code, np.arange(len(self.chroms) + 1))
+
+        # Group id in the high bits, start in the low bits: sorted, so start ranges are searchsorted too
+        group_id = np.repeat(np.arange(len(self._group_code), dtype=np.int64), np.diff(self._group_first))
+        self._group_pos = (group_id << 32) + (pos - (pos.min() if n else 0))
+        self._pos_offset = int(pos.min()) if n else 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def _chrom_codes(self, chroms):
+        if chroms is None:
+            return range(len(self.chroms))
+        if callable(chroms):
+            return [k for k, name in enumerate(self.chroms) if chroms(name)]
+        wanted = {str(c) for c in chroms}
+        return [k for k, name in enumerate(self.chroms) if name in wanted]
+
+    def rows(self, chroms=None, period=None, start=None):
+        """
+        Positional row numbers of df matching every given condition, in df order.
+        Arguments:
+        - chroms: Chromosome names, or a predicate called with each name.
+        - period: (min, max) inclusive period range; either bound may be None.
+        - start: (min, max) inclusive start range; either bound may be None.
+        """
+        p_lo, p_hi = period if period is not None else (None, None)
+        group_lo, group_hi = [], []
+        for k in self._chrom_codes(chroms):
+            g0, g1 = self._chrom_first_group[k], self._chrom_first_group[k + 1]
+            periods = self._group_period[g0:g1]
+            if p_lo is not None:
+                g0 += np.searchsorted(periods, p_lo, side="left")
+            if p_hi is not None:
+                g1 = self._chrom_first_group[k] + np.searchsorted(periods, p_hi, side="right")
+            if g0 < g1:
+                group_lo.append(g0)
+                group_hi.append(g1)
+        if not group_lo:
+            return np.zeros(0, dtype=np.int64)
+
+        if start is None or start == (None, None):
+            # Each chromosome's selected groups are one contiguous slice
+            starts = self._group_first[group_lo]
+            ends = self._group_first[group_hi]
+        else:
+            groups = np.concatenate([np.arange(a, b) for a, b in zip(group_lo, group_hi)]).astype(np.int64)
+            s_lo, s_hi = start
+            # Bounds are clipped to the group's 32-bit start field; empty slices drop out below
+            lo = min(max(s_lo - self._pos_offset, 0), 1 << 32) if s_lo is not None else 0
+            hi = min(max(s_hi - self._pos_offset, -1), (1 << 32) - 1) if s_hi is not None else (1 << 32) - 1
+            lo_key = (groups << 32) + lo
+            hi_key = (groups << 32) + hi
+            starts = np.searchsorted(self._group_pos, lo_key, side="left")
+            ends = np.searchsorted(self._group_pos, hi_key, side="right")
+
+        lengths = ends - starts
+        keep = lengths > 0
+        starts, lengths = starts[keep], lengths[keep]
+        if not len(starts):
+            return np.zeros(0, dtype=np.int64)
+        # Concatenate the slices without a Python loop over rows
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        sorted_rows = np.arange(lengths.sum()) + offsets
+        return np.sort(self.order[sorted_rows])
+
+    def query(self, chroms=None, period=None, start=None):
+        """Rows of df matching the conditions (see rows), as a DataFrame in df order."""
+        return self.df.iloc[self.rows(chroms, period, start)]
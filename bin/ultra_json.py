@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+ultra_json
+
+Streaming ingestion of ULTRA JSON output, replacing the ultra2tsv.v1.sh
+(cat | perl | awk) conversion.
+
+ULTRA writes one JSON object per repeat (SequenceName, Start, Length, Period,
+Score, Substitutions, Insertions, Deletions, Consensus, Sequence and the
+nested SubRepeats array), usually inside a top-level {"Repeats": [...]}
+document. The file is read in blocks and each repeat object is decoded on its
+own with json.JSONDecoder.raw_decode, so memory is bounded by the block size
+and the largest single record, never by the file. Records are found by their
+leading "SequenceName" key, the same anchor ultra2tsv.v1.sh relied on.
+
+- iter_ultra_json(): yield repeat records as dicts.
+- json_to_cache(): write records straight into the ultra_io Parquet cache
+  (<input>.parquet/); the subrepeat arrays are kept as compact JSON strings in
+  the optional 'subrepeats' column.
+- read_ultra_json() / iter_ultra_json_frames(): pandas frames with the
+  canonical ULTRA columns, used by ultra_io when pyarrow is not installed.
+
+Normally there is no need to call this directly: ultra_io.read_ultra() accepts
+ULTRA JSON and ingests it on first use. As a CLI it pre-builds the caches and,
+with --tsv, still writes the legacy 10-column TSV for tools outside this repo.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from fasta_io import open_fasta
+from ultra_io import (CACHE_ROW_GROUP, DEFAULT_CHUNK_ROWS, ULTRA_COLUMNS, ULTRA_DTYPES, check_columns,
+                      coerce_column, column_file, finish_cache, group_stats, new_cache_tmp, normalize_column_name)
+
+BLOCK_SIZE = 4 << 20  # characters read per block
+
+# ULTRA JSON keys for each canonical column
+JSON_FIELDS = {
+    "chr": "SequenceName",
+    "pos": "Start",
+    "len": "Length",
+    "period": "Period",
+    "score": "Score",
+    "sub": "Substitutions",
+    "ins": "Insertions",
+    "del": "Deletions",
+    "cons": "Consensus",
+    "seq": "Sequence",
+}
+JSON_COLUMNS = ULTRA_COLUMNS + ["subrepeats"]
+
+_RECORD_START = re.compile(r'\{\s*"SequenceName"\s*:')
+
+def iter_ultra_json(path, block_size=BLOCK_SIZE):
+    """
+    Yield each repeat record of an ULTRA JSON file (plain or gzip) as a dict.
+    Raises ValueError if a record is truncated or malformed.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    with open_fasta(path, "rt") as fh:
+        while True:
+            match = _RECORD_START.search(buf, pos)
+            if match is not None:
+                try:
+                    record, end = decoder.raw_decode(buf, match.start())
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise ValueError(f"{path}: malformed ULTRA record ({e.msg}).") from e
+                    record = None  # incomplete: read more and decode again
+                if record is not None:
+                    yield record
+                    pos = end
+                    continue
+                pos = match.start()
+            elif eof:
+                return
+            else:
+                # Keep a short tail in case a record start straddles two blocks
+                pos = max(pos, len(buf) - 64)
+
+            # Drop what has been consumed, then read at least as much as is buffered so a
+            # record larger than a block is re-decoded only O(log size) times
+            buf = buf[pos:]
+            pos = 0
+            block = fh.read(max(block_size, len(buf)))
+            eof = not block
+            buf += block
+
+def _subrepeats(record):
+    for key, value in record.items():
+        if normalize_column_name(key) == "subrepeats":
+            return json.dumps(value, separators=(",", ":"))
+    return None
+
+def record_row(record):
+    """Map one ULTRA JSON record to a tuple of JSON_COLUMNS values (missing fields are None)."""
+    row = [record.get(JSON_FIELDS[c]) for c in ULTRA_COLUMNS]
+    row[0] = str(row[0])
+    row.append(_subrepeats(record))
+    return row
+
+def _iter_row_batches(path, batch_rows):
+    """Yield lists of record_row() tuples, at most batch_rows long."""
+    batch = []
+    for record in iter_ultra_json(path):
+        batch.append(record_row(record))
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _arrow_types():
+    import pyarrow as pa
+
+    types = {"category": pa.int32(), "int32": pa.int32(), "float32": pa.float32(), "object": pa.string()}
+    return {c: types[ULTRA_DTYPES[c]] for c in JSON_COLUMNS}
+
+def json_to_cache(path, batch_rows=CACHE_ROW_GROUP):
+    """
+    Stream an ULTRA JSON file into the ultra_io Parquet cache and return its manifest.
+    Every column goes to its own file in record order, every batch_rows records form a
+    row group, and chromosomes are numbered in order of first appearance.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = _arrow_types()
+    tmp = new_cache_tmp(path)
+    writers = {c: pq.ParquetWriter(os.path.join(tmp, os.path.basename(column_file(path, c))),
+                                   pa.schema([(c, types[c])]))
+               for c in JSON_COLUMNS}
+    chroms = {}
+    groups = []
+    try:
+        for batch in _iter_row_batches(path, batch_rows):
+            columns = dict(zip(JSON_COLUMNS, zip(*batch)))
+            codes = np.array([chroms.setdefault(name, len(chroms)) for name in columns["chr"]], dtype=np.int32)
+            for c, writer in writers.items():
+                array = pa.array(codes if c == "chr" else columns[c], type=types[c])
+                writer.write_table(pa.Table.from_arrays([array], names=[c]))
+            numeric = {c: np.array([np.nan if v is None else v for v in columns[c]], dtype=np.float64)
+                       for c in ("period", "pos")}
+            groups.append(group_stats(codes, numeric["period"], numeric["pos"]))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return finish_cache(path, tmp, JSON_COLUMNS, list(chroms), groups, JSON_COLUMNS)
+
+def _frame(batch, wanted):
+    df = pd.DataFrame.from_records(batch, columns=JSON_COLUMNS)
+    for c in wanted:
+        dtype = ULTRA_DTYPES[c]
+        if dtype == "category":
+            df[c] = df[c].astype("category")
+        elif dtype != "object":
+            df[c] = coerce_column(df[c], dtype)
+    return df[wanted]
+
+def iter_ultra_json_frames(path, columns=None, chunksize=DEFAULT_CHUNK_ROWS):
+    """Yield DataFrames of at most chunksize records with the requested canonical columns."""
+    wanted = check_columns(columns)
+    batch = []
+    for record in iter_ultra_json(path):
+        batch.append(record_row(record))
+        if len(batch) >= chunksize:
+            yield _frame(batch, wanted)
+            batch = []
+    if batch:
+        yield _frame(batch, wanted)
+
+def read_ultra_json(path, columns=None):
+    """Read a whole ULTRA JSON file into a DataFrame with the requested canonical columns."""
+    wanted = check_columns(columns)
+    frames = list(iter_ultra_json_frames(path, wanted))
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype=ULTRA_DTYPES[c]) for c in wanted})
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if "chr" in df.columns:
+        df["chr"] = df["chr"].astype(str).astype("category")  # chunk categories differ; rebuild one set
+    return df
+
+def write_tsv(path, tsv_path):
+    """Write the legacy headerless 10-column TSV produced by ultra2tsv.v1.sh."""
+    with open(tsv_path, "w") as out:
+        for record in iter_ultra_json(path):
+            row = record_row(record)[:len(ULTRA_COLUMNS)]
+            out.write("\t".join("" if v is None else str(v) for v in row) + "\n")
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Ingest ULTRA JSON output into the columnar cache used by the ULTRA tools in bin/.",
+        epilog="""
+Example:
+    python ultra_json.py results/sample.json
+    python ultra_json.py --tsv results/*.json
+
+For each input F.json the cache F.json.parquet/ is (re)built; the plotting and
+analysis scripts then accept F.json directly. --tsv also writes F.tsv in the
+ultra2tsv.v1.sh layout.
+""",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("json_files", nargs="+", help="ULTRA JSON file(s), plain or gzip.")
+    parser.add_argument("--tsv", action="store_true",
+                        help="Also write the legacy 10-column TSV next to each input.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Skip building the Parquet cache (e.g. with --tsv only).")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    for json_file in args.json_files:
+        if not args.no_cache:
+            manifest = json_to_cache(json_file)
+            rows = manifest["rows"]
+            print(f"{json_file}: {rows} repeats on {len(manifest['chroms'])} sequences cached", file=sys.stderr)
+        if args.tsv:
+            tsv_path = re.sub(r"\.json(\.gz)?$", "", json_file) + ".tsv"
+            write_tsv(json_file, tsv_path)
+            print(f"TSV written: {tsv_path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
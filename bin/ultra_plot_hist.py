@@ -4,13 +4,23 @@ ultra_plot_hist (CLI)
 
 - periods mode: histogram of period sizes (column 'period').
 - arrays mode: violin plots of array sizes (len/1000 kb) per chromosome,
-  filtered by period -x, with medians, IQR bars, and Tukey whiskers.
+  filtered by period -x, with medians, IQR bars, and Tukey whiskers
+  (--stats-out also writes those numbers per chromosome as a TSV).
+- chrom-hist mode: per-chromosome period, array-size (kb) and position (Mb)
+  histograms as text dot bars, the output of ULTRA_plot_chrom_hist, from one read.
+- ridgeline mode: chromosome x Mb-bin repeat counts for several period classes
+  from one read, one '<frequency> <position> <chromosome>' file per class for
+  ridgeline_plot.R (--out is the file prefix).
+- --batch: render many figures of one table from a manifest (TSV or YAML).
 
 Examples
 --------
 # Period-size histogram (all periods)
 python ultra_plot_hist.py -f repeats.tsv -m periods -b 100 --out periods_hist.png
 
+# Same, plus the per-period counts as a TSV (counts are cached in repeats.tsv.periods.json)
+python ultra_plot_hist.py -f repeats.tsv -m periods --counts-out period_counts.tsv --out periods_hist.png
+
 # Period-size histogram for 155–156 bp monomers (log x)
 python ultra_plot_hist.py -f repeats.tsv -m periods -x 155-156 -b 60 --logx --out periods_155_156.png
 
@@ -22,10 +32,29 @@ python ultra_plot_hist.py -f repeats.tsv -m arrays -x 165 --cmap none --facecolo
 
 # Custom spaced positions (must match #chromosomes)
 python ultra_plot_hist.py -f repeats.tsv -m arrays -x 165 --positions 1,5,7,9,12
+
+# Per-chromosome text histograms for Gm01..Gm20 (ULTRA_plot_chrom_hist -m arrays -x 91-92 -p Gm -s 01 -e 20)
+python ultra_plot_hist.py -f repeats.tsv -m chrom-hist --chrom-hist arrays -x 91-92 --chr-prefix Gm --chr-range 01-20
+
+# All three, one scan of the table (specific needs a single period)
+python ultra_plot_hist.py -f repeats.tsv -m chrom-hist --chrom-hist periods,arrays,specific -x 91 --out chrom_hist.txt
+
+# ridgeline_plot.R inputs for all repeats, 91, 92 and 91-92 bp on Gm01..Gm20 (gm.all.ridgeline.txt, ...)
+python ultra_plot_hist.py -f repeats.tsv -m ridgeline --classes all,91,92,91-92 --chr-prefix Gm --chr-range 01-20 --out gm
+Rscript ridgeline_plot.R gm.91-92.ridgeline.txt
+
+# Batch: one read of the table, one figure per manifest row, 4 worker processes
+python ultra_plot_hist.py -f repeats.tsv --batch plots.tsv -j 4 --cmap rainbow
+# plots.tsv (tab-separated; empty cells take the command-line value):
+#   mode     x-spec   bins  logx  out
+#   periods           100         periods_all.png
+#   periods  155-156  60    yes   periods_155_156.png
+#   arrays   165                  arrays_165.png
 """
 
 import argparse
 import re
+import sys
 from typing import Optional, Tuple, List
 
 import numpy as np
@@ -34,6 +63,8 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MultipleLocator, FuncFormatter, MaxNLocator
 
+from ultra_io import DEFAULT_CHUNK_ROWS, UltraIndex, count_periods, read_ultra
+
 # ---------- Global styling ----------
 mpl.rcParams['pdf.fonttype'] = 42
 mpl.rcParams['ps.fonttype']  = 42
@@ -68,22 +99,24 @@ def parse_positions(s: Optional[str]) -> Optional[List[float]]:
         raise ValueError(f"Could not parse --positions: {s!r}") from e
 
 
-def read_ultra_file(file: str) -> pd.DataFrame:
-    # Use exactly your signature:
-    df = pd.read_csv(
-        file,
-        sep="\t",
-        names=['chr', 'pos', 'len', 'period', 'score', 'sub', 'ins', 'del', 'cons', 'seq'],
-        usecols=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
-    )
-    return df
+def read_ultra_file(file: str, lbub: Optional[Tuple[int, int]] = None, cache: bool = True) -> pd.DataFrame:
+    """
+    Load only the columns the plot modes use (chr, pos, len, period); see ultra_io.read_ultra.
+    A period range is pushed down to the reader, so only matching rows are materialized
+    when the <file>.parquet cache is in use.
+    """
+    return read_ultra(file, columns=["chr", "pos", "len", "period"], period=lbub, cache=cache)
 
 
 # ---------- Helpers ----------
-def apply_period_filter(df: pd.DataFrame, lbub: Optional[Tuple[int, int]]) -> pd.DataFrame:
+def apply_period_filter(df: pd.DataFrame, lbub: Optional[Tuple[int, int]],
+                        index: Optional[UltraIndex] = None) -> pd.DataFrame:
+    """Rows with lb <= period <= ub. With an UltraIndex over df this is a slice, not a scan."""
     if lbub is None:
         return df
     lb, ub = lbub
+    if index is not None:
+        return index.query(period=(lb, ub)).copy()
     return df[(df['period'] >= lb) & (df['period'] <= ub)].copy()
 
 
@@ -100,12 +133,54 @@ def natural_chr_sort(chr_values: List[str]) -> List[str]:
     return sorted(chr_values, key=keyfun)
 
 
-def tukey_whiskers(q1: float, q3: float, data: np.ndarray) -> tuple[float, float]:
-    """Return (lower, upper) Tukey bounds clipped to data range."""
+def sorted_percentiles(values: np.ndarray, starts: np.ndarray, counts: np.ndarray,
+                       q: float) -> np.ndarray:
+    """
+    q-th percentile of every group of an array sorted within groups, where group g is
+    values[starts[g]:starts[g] + counts[g]] (counts > 0). Same linear interpolation as np.percentile.
+    """
+    h = (counts - 1) * (q / 100.0)
+    lo = np.floor(h).astype(np.int64)
+    hi = np.minimum(lo + 1, counts - 1)
+    return values[starts + lo] + (h - lo) * (values[starts + hi] - values[starts + lo])
+
+
+def array_stats_by_chr(dff: pd.DataFrame) -> Tuple[List[str], List[np.ndarray], pd.DataFrame]:
+    """
+    Array sizes (kb) per chromosome and their summary statistics in one grouped pass:
+    rows are sorted once by (chromosome, size), so every chromosome is a contiguous
+    sorted slice and its quartiles, median and Tukey whiskers are index lookups.
+    Returns (chromosomes in natural order, sorted kb arrays for the violins, stats table).
+    """
+    codes, names = pd.factorize(dff['chr'].astype(str), sort=False)
+    values = dff['len'].to_numpy(dtype=float) / 1000.0
+    order = np.lexsort((values, codes))
+    values = values[order]
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+
+    # Natural chromosome order, as slices of the sorted array
+    chrs = natural_chr_sort([str(n) for n in names])
+    code_of = {str(n): k for k, n in enumerate(names)}
+    group = np.array([code_of[c] for c in chrs], dtype=np.int64)
+    starts, counts = bounds[group], np.diff(bounds)[group]
+    dataset = [values[b0:b0 + n] for b0, n in zip(starts, counts)]
+
+    q1, median, q3 = (sorted_percentiles(values, starts, counts, q) for q in (25, 50, 75))
+    vmin, vmax = values[starts], values[starts + counts - 1]
     iqr = q3 - q1
-    upper = np.clip(q3 + 1.5 * iqr, q3, np.max(data))
-    lower = np.clip(q1 - 1.5 * iqr, np.min(data), q1)
-    return float(lower), float(upper)
+    stats = pd.DataFrame({
+        "chr": chrs,
+        "n": counts,
+        "min_kb": vmin,
+        "whisker_low_kb": np.clip(q1 - 1.5 * iqr, vmin, q1),
+        "q1_kb": q1,
+        "median_kb": median,
+        "q3_kb": q3,
+        "whisker_high_kb": np.clip(q3 + 1.5 * iqr, q3, vmax),
+        "max_kb": vmax,
+        "mean_kb": np.add.reduceat(values, bounds[:-1])[group] / counts if len(values) else np.zeros(0),
+    })
+    return chrs, dataset, stats
 
 
 def set_length_ticks(ax, yunits: str = "kb", step: float | None = None):
@@ -157,14 +232,27 @@ def colors_from_cmap(n: int, cmap_name: str = "tab20") -> List:
 
 
 # ---------- Plotting ----------
-def plot_periods_histogram(df: pd.DataFrame, bins: int, lbub: Optional[Tuple[int, int]],
-                           out: Optional[str], logx: bool) -> None:
-    vals = df['period'].dropna().astype(float).values
+def plot_periods_histogram(df: Optional[pd.DataFrame], bins: int, lbub: Optional[Tuple[int, int]],
+                           out: Optional[str], logx: bool, counts: Optional[pd.Series] = None) -> None:
+    """
+    Histogram of periods, from a DataFrame or from pre-aggregated per-period counts
+    (see ultra_io.count_periods). Both give the same bins: the edges span the
+    observed period range either way. Bins are summed from the distinct periods
+    (np.histogram with weights) and drawn as one step outline, so the cost does
+    not depend on the number of repeats.
+    """
+    if counts is not None:
+        vals = counts.index.to_numpy(dtype=float)
+        weights = counts.to_numpy()
+    else:
+        vals = df['period'].dropna().astype(float).values
+        weights = None
     if vals.size == 0:
         raise SystemExit("No data to plot after filtering periods.")
 
+    hist, edges = np.histogram(vals, bins=bins, weights=weights)
     plt.figure(figsize=(10, 4))
-    plt.hist(vals, bins=bins, density=False)
+    plt.stairs(hist, edges, fill=True)
     if logx:
         plt.xscale('log')
         plt.xlabel("Period size (bp) [log scale]")
@@ -180,6 +268,7 @@ def plot_periods_histogram(df: pd.DataFrame, bins: int, lbub: Optional[Tuple[int
 
     if out:
         plt.savefig(out, dpi=300)
+        plt.close()  # batch mode renders many figures in one process
     else:
         plt.show()
 
@@ -196,21 +285,21 @@ def plot_arrays_violin_by_chr(
     ytick_step: float | None = None,
     cmap_name: str = "tab20",
     full_labels: bool = False,
+    stats_out: Optional[str] = None,
 ) -> None:
     if lbub is None:
         raise SystemExit("Error: -x is required for -m arrays (use N or L-U).")
 
-    # Filter on period
-    dff = apply_period_filter(df, lbub)
+    # df is already restricted to lbub (read pushdown or apply_period_filter in render)
+    dff = df
     if dff.empty:
         raise SystemExit("No rows matched the requested period filter for arrays.")
 
-    # Array size in kb
-    dff = dff.assign(array_kb=dff['len'].astype(float) / 1000.0)
-
-    # Prepare groups by chromosome with natural sorting
-    chrs = natural_chr_sort(dff['chr'].astype(str).unique().tolist())
-    dataset = [dff.loc[dff['chr'].astype(str) == c, 'array_kb'].values for c in chrs]
+    # Array sizes (kb) grouped by chromosome with natural sorting, plus their statistics
+    chrs, dataset, stats = array_stats_by_chr(dff)
+    if stats_out:
+        stats.to_csv(stats_out, sep="\t", index=False)
+        print(f"Per-chromosome statistics written: {stats_out}")
 
     # Positions: user-specified or sequential 1..N
     if positions is None:
@@ -245,25 +334,21 @@ def plot_arrays_violin_by_chr(
     vp['cmins'].set_color('black')
     vp['cbars'].set_color('black')
 
-    # Quantiles and Tukey whiskers
-    q = [np.percentile(arr, [25, 50, 75]) for arr in dataset]
-    whiskers = [tukey_whiskers(qq[0], qq[2], arr) for qq, arr in zip(q, dataset)]
-
     # Median markers (white dots)
     ax.scatter(
-        positions, [qq[1] for qq in q],
+        positions, stats["median_kb"],
         marker='o', color='white', s=30, zorder=3, edgecolor='black', linewidth=0.6
     )
 
     # IQR bars
     ax.vlines(
-        positions, [qq[0] for qq in q], [qq[2] for qq in q],
+        positions, stats["q1_kb"], stats["q3_kb"],
         color='black', linestyle='-', lw=5, zorder=2
     )
 
     # Whiskers
     ax.vlines(
-        positions, [w[0] for w in whiskers], [w[1] for w in whiskers],
+        positions, stats["whisker_low_kb"], stats["whisker_high_kb"],
         color='black', linestyle='-', lw=2, zorder=2
     )
 
@@ -282,21 +367,240 @@ def plot_arrays_violin_by_chr(
     fig.tight_layout()
     if out:
         fig.savefig(out, dpi=300)
+        plt.close(fig)
     else:
         plt.show()
 
 
+# ---------- Per-chromosome text histograms ----------
+CHROM_HIST_KINDS = ("periods", "arrays", "specific")
+
+# Rows kept per kind, as (min count, min value): the awk filters of ULTRA_plot_chrom_hist
+CHROM_HIST_MIN = {"periods": (10, 60), "arrays": (1, 1), "specific": (1, 1)}
+
+
+def parse_chr_range(chr_range: str) -> List[str]:
+    """'1-20' -> ['01', ..., '20']: zero-padded like `seq -w S E`."""
+    m = re.fullmatch(r"(\d+)-(\d+)", re.sub(r"\s+", "", str(chr_range)))
+    if not m:
+        raise ValueError(f"--chr-range must be S-E (e.g., 1-20 or 01-20). Got: {chr_range!r}")
+    s, e = m.groups()
+    width = max(len(s), len(e), len(str(int(e))))
+    return [str(i).zfill(width) for i in range(int(s), int(e) + 1)]
+
+
+def chrom_hist_rows(labels: List[str], prefix: str = "Chr",
+                    chr_range: Optional[str] = None) -> Tuple[List[str], dict]:
+    """
+    Output rows and the row of every chromosome label. Without chr_range every label
+    is its own row (natural order). With it, row i is headed <prefix><i> and collects
+    the labels ending in it, e.g. 'Gm01' picks 'glyma.Wm82.gnm4.Gm01'.
+    """
+    if chr_range is None:
+        headers = natural_chr_sort([str(c) for c in labels])
+        return headers, {h: i for i, h in enumerate(headers)}
+    headers = [f"{prefix}{i}" for i in parse_chr_range(chr_range)]
+    by_tag = {h: i for i, h in enumerate(headers)}
+    row_of = {}
+    for label in labels:
+        for tag, i in by_tag.items():
+            if str(label).endswith(tag):
+                row_of[label] = i
+                break
+    return headers, row_of
+
+
+def chrom_hist_values(df: pd.DataFrame, kind: str) -> np.ndarray:
+    """The binned value of every repeat: period (bp), array size (kb) or position (Mb)."""
+    if kind == "periods":
+        return df["period"].to_numpy(dtype=np.int64)
+    if kind == "arrays":
+        return df["len"].to_numpy(dtype=np.int64) // 1000
+    return df["pos"].to_numpy(dtype=np.int64) // 1_000_000
+
+
+def parse_chrom_hist_kinds(spec: str) -> List[str]:
+    """'periods,arrays' -> ['periods', 'arrays'], rejecting unknown kinds."""
+    kinds = [k.strip() for k in spec.split(",") if k.strip()]
+    for kind in kinds:
+        if kind not in CHROM_HIST_KINDS:
+            raise SystemExit(f"Error: unknown --chrom-hist kind {kind!r} (use: {', '.join(CHROM_HIST_KINDS)}).")
+    return kinds
+
+
+def chrom_hist_period_range(kinds: List[str], lbub: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """Period range the rows must be read over; periods ignores -x, as in ULTRA_plot_chrom_hist."""
+    return None if "periods" in kinds else lbub
+
+
+def chrom_histograms(df: pd.DataFrame, n_rows: int, codes: np.ndarray, kinds: List[str],
+                     lbub: Optional[Tuple[int, int]]) -> dict:
+    """
+    {kind: (n_rows, max value + 1) count matrix}. codes gives each repeat's output row
+    (-1 = not shown); every kind is one 2-D bincount over (row, value). lbub limits the
+    arrays and specific kinds only.
+    """
+    shown = codes >= 0
+    in_range = shown
+    if lbub is not None:
+        periods = df["period"].to_numpy(dtype=np.int64)
+        in_range = shown & (periods >= lbub[0]) & (periods <= lbub[1])
+    hists = {}
+    for kind in kinds:
+        sel = shown if kind == "periods" else in_range
+        rows = codes[sel]
+        values = chrom_hist_values(df, kind)[sel]
+        width = int(values.max()) + 1 if values.size else 1
+        hists[kind] = np.bincount(rows * width + values, minlength=n_rows * width).reshape(n_rows, width)
+    return hists
+
+
+def format_chrom_hist(headers: List[str], hist: np.ndarray, kind: str, bar_scale: int) -> str:
+    """Text dot bars as printed by ULTRA_plot_chrom_hist: header, 'value<TAB>....' lines, blank line."""
+    min_count, min_value = CHROM_HIST_MIN[kind]
+    lines = []
+    for header, row in zip(headers, hist):
+        lines.append(header)
+        for value in np.flatnonzero(row >= min_count):
+            if value >= min_value:
+                lines.append(f"{value}\t{'.' * int(row[value] // bar_scale)}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def read_chrom_rows(args: argparse.Namespace, columns: List[str], period: Optional[Tuple[int, int]],
+                    df: Optional[pd.DataFrame] = None,
+                    index: Optional[UltraIndex] = None) -> Tuple[pd.DataFrame, List[str], np.ndarray]:
+    """
+    Read columns (with the --chr-range chromosomes and the period range pushed down) and
+    return (df, row headers, output row of every repeat, -1 when not shown). A preloaded df
+    (batch mode) is only cut to the period range; chromosomes off --chr-range get row -1.
+    """
+    if df is not None:
+        df = apply_period_filter(df, period, index)
+    else:
+        chroms = None
+        if args.chr_range:
+            tags = tuple(f"{args.chr_prefix}{i}" for i in parse_chr_range(args.chr_range))
+            chroms = lambda name: str(name).endswith(tags)
+        df = read_ultra(args.file, columns=columns, chroms=chroms, period=period, cache=not args.no_cache)
+
+    label_codes, labels = pd.factorize(df["chr"])
+    headers, row_of = chrom_hist_rows(list(labels), args.chr_prefix, args.chr_range)
+    lut = np.array([row_of.get(label, -1) for label in labels] + [-1], dtype=np.int64)
+    return df, headers, lut[label_codes]  # factorize's -1 (missing chr) lands on the trailing -1
+
+
+def write_chrom_hist(args: argparse.Namespace, df: Optional[pd.DataFrame] = None,
+                     index: Optional[UltraIndex] = None) -> None:
+    """
+    Per-chromosome dot-bar histograms (-m chrom-hist) for every kind in --chrom-hist,
+    from a single read of chr/pos/len/period (or the given df).
+    """
+    kinds = parse_chrom_hist_kinds(args.chrom_hist)
+    lbub = parse_x_spec(args.x_spec) if args.x_spec else None
+    if lbub is None and kinds != ["periods"]:
+        raise SystemExit("Error: -x is required for the arrays and specific histograms (use N or L-U).")
+    if "specific" in kinds and lbub[0] != lbub[1]:
+        raise SystemExit("Error: the specific histogram expects a single -x value (e.g., -x 104), not a range.")
+
+    df, headers, codes = read_chrom_rows(args, ["chr", "pos", "len", "period"],
+                                         chrom_hist_period_range(kinds, lbub), df, index)
+    hists = chrom_histograms(df, len(headers), codes, kinds, lbub)
+
+    blocks = []
+    for kind in kinds:
+        scale = args.bar_scale or (10 if kind == "arrays" else 100)
+        text = format_chrom_hist(headers, hists[kind], kind, scale)
+        blocks.append(f"## {kind}\n{text}" if len(kinds) > 1 else text)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write("".join(blocks))
+        print(f"Chromosome histograms written: {args.out}")
+    else:
+        sys.stdout.write("".join(blocks))
+
+
+# ---------- Ridgeline inputs ----------
+def parse_classes(spec: str) -> List[Tuple[str, Optional[Tuple[int, int]]]]:
+    """'all,91,92,91-92' -> [('all', None), ('91', (91, 91)), ('92', (92, 92)), ('91-92', (91, 92))]."""
+    classes = []
+    for tok in (t.strip() for t in spec.split(",")):
+        if tok:
+            classes.append((tok, None) if tok.lower() == "all" else (tok, parse_x_spec(tok)))
+    if not classes:
+        raise SystemExit("Error: --classes is empty.")
+    return classes
+
+
+def class_bin_counts(df: pd.DataFrame, n_rows: int, codes: np.ndarray,
+                     classes: List[Tuple[str, Optional[Tuple[int, int]]]]) -> np.ndarray:
+    """
+    (class, chromosome row, Mb bin) repeat counts. Classes may overlap, so every class
+    contributes its own index block and the whole cube is a single bincount.
+    """
+    shown = codes >= 0
+    periods = df["period"].to_numpy(dtype=np.int64)
+    bins = df["pos"].to_numpy(dtype=np.int64) // 1_000_000
+    width = int(bins[shown].max()) + 1 if shown.any() else 1
+    cell = codes * width + bins
+    blocks = []
+    for k, (_, lbub) in enumerate(classes):
+        sel = shown if lbub is None else shown & (periods >= lbub[0]) & (periods <= lbub[1])
+        blocks.append(cell[sel] + k * n_rows * width)
+    flat = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+    return np.bincount(flat, minlength=len(classes) * n_rows * width).reshape(len(classes), n_rows, width)
+
+
+def ridgeline_table(counts: np.ndarray, chrom_ids: List[str]) -> pd.DataFrame:
+    """Long format of one class, rows with repeats only: frequency, position (Mb bin), chromosome."""
+    rows, bins = np.nonzero(counts)
+    return pd.DataFrame({"frequency": counts[rows, bins], "position": bins,
+                         "chromosome": np.asarray(chrom_ids, dtype=object)[rows]})
+
+
+def classes_period_range(classes: List[Tuple[str, Optional[Tuple[int, int]]]]) -> Optional[Tuple[int, int]]:
+    """Smallest period range covering every class; None when a class takes all periods."""
+    ranges = [lbub for _, lbub in classes]
+    if any(r is None for r in ranges):
+        return None
+    return (min(r[0] for r in ranges), max(r[1] for r in ranges))
+
+
+def write_ridgeline(args: argparse.Namespace, df: Optional[pd.DataFrame] = None,
+                    index: Optional[UltraIndex] = None) -> None:
+    """
+    ridgeline_plot.R inputs (-m ridgeline): one '<frequency> <Mb bin> <chromosome>' file per
+    --classes entry, all counted from a single read of chr/pos/period (or the given df).
+    """
+    classes = parse_classes(args.classes)
+    df, headers, codes = read_chrom_rows(args, ["chr", "pos", "period"], classes_period_range(classes), df, index)
+    counts = class_bin_counts(df, len(headers), codes, classes)
+
+    # The shell loops printed the bare chromosome number ({01..20} through awk -> 1..20)
+    chrom_ids = [str(int(h[len(args.chr_prefix):])) for h in headers] if args.chr_range else headers
+    prefix = args.out or args.file
+    for (name, _), class_counts in zip(classes, counts):
+        out = f"{prefix}.{name}.ridgeline.txt"
+        ridgeline_table(class_counts, chrom_ids).to_csv(out, sep=" ", header=False, index=False)
+        print(f"Ridgeline input written: {out}")
+
+
 # ---------- CLI ----------
-def main():
+def build_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser(description="ULTRA_plot_hist (Python CLI)")
     ap.add_argument("-f", "--file", required=True, help="Input ULTRA TSV file")
-    ap.add_argument("-m", "--mode", choices=["periods", "arrays"], default="periods",
-                    help="Plot mode: periods (histogram) or arrays (violins per chromosome)")
+    ap.add_argument("-m", "--mode", choices=["periods", "arrays", "chrom-hist", "ridgeline"],
+                    default="periods",
+                    help="Plot mode: periods (histogram), arrays (violins per chromosome), chrom-hist "
+                         "(per-chromosome text dot bars, as ULTRA_plot_chrom_hist) or ridgeline "
+                         "(count tables for ridgeline_plot.R)")
     ap.add_argument("-x", "--x-spec",
                     help="N or L-U period filter (e.g. 165 or 155-156). Required for arrays.")
     ap.add_argument("-b", "--bins", type=int, default=100,
                     help="Bins for histogram (periods mode). Default 100.")
-    ap.add_argument("--out", help="Output image path. If omitted, opens an interactive window.")
+    ap.add_argument("--out", help="Output image path (text file for chrom-hist, file prefix for ridgeline). "
+                                  "If omitted, opens an interactive window.")
     ap.add_argument("--logx", action="store_true", help="Use log-scale on x-axis for periods histogram.")
     ap.add_argument("--logy", action="store_true",
                     help="(Deprecated for arrays when using unit ticks) Log-scale on y-axis.")
@@ -313,19 +617,72 @@ def main():
                          "Use 'none' for a single facecolor.")
     ap.add_argument("--full-labels", action="store_true",
                     help="Use the full chromosome labels (disable shortening after last '.').")
-    args = ap.parse_args()
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Parse the ULTRA text every time instead of using (or creating) the <file>.parquet cache.")
+    ap.add_argument("--counts-out",
+                    help="Write the repeat count of every period (after -x) to this TSV (periods mode).")
+    ap.add_argument("--stats-out",
+                    help="Write per-chromosome array-size statistics (n, quartiles, whiskers, mean; kb) "
+                         "to this TSV (arrays mode).")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNK_ROWS,
+                    help=f"Rows per chunk when counting periods (periods mode). Default {DEFAULT_CHUNK_ROWS:,}.")
+    ap.add_argument("--batch",
+                    help="Manifest (TSV with a header row, or YAML list) of plot specifications, one per row/item, "
+                         "keyed by the long option names (mode, x-spec, bins, out, logx, cmap, ...). The table "
+                         "is read once and every figure is rendered from it; options given on the command line "
+                         "are the defaults of every row.")
+    ap.add_argument("-j", "--jobs", type=int, default=1,
+                    help="Worker processes for --batch rendering (Agg backend). Default 1.")
+    ap.add_argument("--chrom-hist", default="periods",
+                    help="chrom-hist mode: comma-separated histograms, from periods (period sizes), arrays "
+                         "(array sizes, kb) and specific (positions, Mb; single -x). -x does not limit periods. "
+                         "Default periods.")
+    ap.add_argument("--classes", default="all",
+                    help="ridgeline mode: comma-separated period classes, each all, N or L-U "
+                         "(e.g., all,91,92,91-92); one output file per class. Default all.")
+    ap.add_argument("--chr-range",
+                    help="chrom-hist/ridgeline modes: chromosome numbers S-E, zero-padded like seq -w (e.g., 1-20). "
+                         "Default: every chromosome, under its full name.")
+    ap.add_argument("--chr-prefix", default="Chr",
+                    help="chrom-hist/ridgeline modes: label prefix before the --chr-range number (e.g., Gm). Default Chr.")
+    ap.add_argument("--bar-scale", type=int, default=None,
+                    help="chrom-hist mode: repeats per dot. Default 100 (10 for arrays).")
+    return ap
+
+
+def slice_counts(counts: pd.Series, lbub: Optional[Tuple[int, int]]) -> pd.Series:
+    """Per-period counts restricted to lb <= period <= ub."""
+    if lbub is None:
+        return counts
+    lb, ub = lbub
+    periods = counts.index.to_numpy()
+    return counts[(periods >= lb) & (periods <= ub)]
 
+
+def render(args: argparse.Namespace, df: Optional[pd.DataFrame] = None, counts: Optional[pd.Series] = None,
+           index: Optional[UltraIndex] = None) -> None:
+    """
+    Draw the figure described by args. df (chr, pos, len, period), its UltraIndex and the
+    whole-table counts are loaded here unless given, as in batch mode where they are shared.
+    """
     lbub = parse_x_spec(args.x_spec) if args.x_spec else None
-    df = read_ultra_file(args.file)
 
     if args.mode == "periods":
-        plot_periods_histogram(
-            df if lbub is None else apply_period_filter(df, lbub),
-            bins=args.bins, lbub=lbub, out=args.out, logx=args.logx
-        )
+        if counts is None:
+            # Whole-table counts are kept in <file>.periods.json, so re-plotting with other -x/--bins/--logx is instant
+            counts = count_periods(args.file, period=lbub, cache=not args.no_cache, chunksize=args.chunksize)
+        counts = slice_counts(counts, lbub)
+        if args.counts_out:
+            counts.to_csv(args.counts_out, sep="\t", header=True)
+            print(f"Period counts written: {args.counts_out}")
+        plot_periods_histogram(None, bins=args.bins, lbub=lbub, out=args.out, logx=args.logx, counts=counts)
     elif args.mode == "arrays":
         if lbub is None:
             raise SystemExit("Error: -x is required for -m arrays (use N or L-U).")
+        if df is None:
+            df = read_ultra_file(args.file, lbub, cache=not args.no_cache)
+        else:
+            df = apply_period_filter(df, lbub, index)
         pos = parse_positions(args.positions)
         plot_arrays_violin_by_chr(
             df, lbub, out=args.out,
@@ -336,11 +693,133 @@ def main():
             ytick_step=args.ytick_step,
             cmap_name=args.cmap,
             full_labels=args.full_labels,
+            stats_out=args.stats_out,
         )
+    elif args.mode == "chrom-hist":
+        write_chrom_hist(args, df, index)
+    elif args.mode == "ridgeline":
+        write_ridgeline(args, df, index)
     else:
         raise SystemExit(f"Unknown mode: {args.mode}")
 
 
+# ---------- Batch mode ----------
+def read_manifest(path: str) -> List[dict]:
+    """
+    Plot specifications from a TSV (header row of option names) or YAML manifest
+    (a list of mappings, or a mapping with a 'plots' list). Keys may use - or _.
+    """
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("Error: YAML manifests need PyYAML (pip install pyyaml); or use a TSV manifest.")
+        with open(path) as fh:
+            specs = yaml.safe_load(fh) or []
+        if isinstance(specs, dict):
+            specs = specs.get("plots", [])
+    else:
+        specs = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False, comment="#").to_dict("records")
+    return [{str(k).strip().lstrip("-").replace("_", "-"): v for k, v in spec.items()} for spec in specs]
+
+
+# Options a --batch manifest row may set, by long name; the flags take true/false values
+BATCH_OPTIONS = ("mode", "x-spec", "bins", "out", "positions", "facecolor", "yunits", "ytick-step", "cmap",
+                 "counts-out", "stats-out", "chunksize", "chrom-hist", "classes", "chr-range", "chr-prefix",
+                 "bar-scale")
+BATCH_FLAGS = ("logx", "logy", "full-labels", "no-cache")
+
+
+def spec_args(ap: argparse.ArgumentParser, args: argparse.Namespace, spec: dict) -> argparse.Namespace:
+    """One manifest row as parsed options: the command-line args, overridden by the row's non-empty values."""
+    base = argparse.Namespace(**vars(args))
+    tokens = ["--file", args.file]
+    for key, value in spec.items():
+        if key not in BATCH_OPTIONS + BATCH_FLAGS:
+            raise SystemExit(f"Error: unsupported manifest column {key!r}.")
+        if value is None or str(value).strip() == "":
+            continue
+        if key in BATCH_FLAGS:
+            # store_true flags cannot be switched off by parse_args, so set them on the namespace
+            on = value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "y")
+            setattr(base, key.replace("-", "_"), on)
+        else:
+            tokens.append(f"--{key}={value}")
+    # Types and choices are checked by the parser; options not in the row keep the command-line values
+    return ap.parse_args(tokens, namespace=base)
+
+
+_SHARED = {}
+
+
+def _init_batch_worker(df: Optional[pd.DataFrame], counts: pd.Series,
+                       index: Optional[UltraIndex] = None) -> None:
+    # The table and its index are handed to each worker once, not once per figure
+    plt.switch_backend("Agg")
+    _SHARED.update(df=df, counts=counts, index=index)
+
+
+def _render_shared(args: argparse.Namespace) -> Optional[str]:
+    try:
+        render(args, df=_SHARED["df"], counts=_SHARED["counts"], index=_SHARED["index"])
+    except SystemExit as e:
+        return f"{args.out}: {e}"
+    return None
+
+
+def run_batch(ap: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Render every manifest row from one read of the table (see --batch)."""
+    specs = [spec_args(ap, args, spec) for spec in read_manifest(args.batch)]
+    for i, spec in enumerate(specs, 1):
+        if not spec.out:
+            raise SystemExit(f"Error: manifest row {i} has no out; batch mode only writes files.")
+
+    # At most one read each: whole-table period counts if a periods row needs them, and
+    # chr/pos/len/period rows over the union of the period ranges the other rows use
+    counts = None
+    if any(s.mode == "periods" for s in specs):
+        counts = count_periods(args.file, cache=not args.no_cache, chunksize=args.chunksize)
+    ranges = []
+    for s in specs:
+        if s.mode == "arrays" and s.x_spec:
+            ranges.append(parse_x_spec(s.x_spec))
+        elif s.mode == "chrom-hist":
+            ranges.append(chrom_hist_period_range(parse_chrom_hist_kinds(s.chrom_hist), parse_x_spec(s.x_spec)))
+        elif s.mode == "ridgeline":
+            ranges.append(classes_period_range(parse_classes(s.classes)))
+    df = index = None
+    if ranges:
+        period = None
+        if all(r is not None for r in ranges):
+            period = (min(r[0] for r in ranges), max(r[1] for r in ranges))
+        df = read_ultra_file(args.file, period, cache=not args.no_cache)
+        # Sorted once; every row is then a period slice instead of a full-table mask
+        index = UltraIndex(df, "chr", "period", "pos")
+
+    if args.jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_batch_worker,
+                                 initargs=(df, counts, index)) as pool:
+            errors = list(pool.map(_render_shared, specs))
+    else:
+        _init_batch_worker(df, counts, index)
+        errors = [_render_shared(spec) for spec in specs]
+
+    for error in errors:
+        if error:
+            print(f"Skipped {error}")
+    print(f"Batch: {sum(e is None for e in errors)} of {len(specs)} figures written.")
+
+
+def main():
+    ap = build_parser()
+    args = ap.parse_args()
+    if args.batch:
+        run_batch(ap, args)
+    else:
+        render(args)
+
+
 if __name__ == "__main__":
     main()
 
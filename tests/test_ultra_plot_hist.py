@@ -0,0 +1,57 @@
+import os
+import re
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "bin"))
+import ultra_plot_hist  # noqa: E402
+
+
+@pytest.fixture
+def ultra_tsv(tmp_path):
+    """A small ULTRA table on sp.Chr01-03 with enough repeats per period to pass the periods filter."""
+    rng = np.random.default_rng(0)
+    n = 6000
+    chrs = rng.choice(["sp.Chr01", "sp.Chr02", "sp.Chr03"], n)
+    pos = rng.integers(0, 5_000_000, n)
+    length = rng.integers(100, 20_000, n)
+    period = rng.choice([60, 75, 91, 92, 110], n)
+    path = tmp_path / "repeats.tsv"
+    with open(path, "w") as fh:
+        for row in zip(chrs, pos, length, period):
+            fh.write("\t".join(map(str, row)) + "\t10.0\t1\t0\t0\tACGT\tACGTACGT\n")
+    return str(path)
+
+
+def chrom_hist(file, out, *options):
+    args = ultra_plot_hist.build_parser().parse_args(
+        ["-f", file, "-m", "chrom-hist", "--no-cache", "--chr-range", "01-03", "--out", str(out), *options])
+    ultra_plot_hist.write_chrom_hist(args)
+    with open(out) as fh:
+        return fh.read()
+
+
+def blocks(text):
+    """{kind: text} of a multi-kind chrom-hist file ('## kind' headers)."""
+    parts = re.split(r"^## (\w+)\n", text, flags=re.M)
+    return dict(zip(parts[1::2], parts[2::2]))
+
+
+def test_combined_periods_ignores_x(ultra_tsv, tmp_path):
+    combined = blocks(chrom_hist(ultra_tsv, tmp_path / "all.txt", "--chrom-hist", "periods,arrays,specific", "-x", "91"))
+    periods = chrom_hist(ultra_tsv, tmp_path / "periods.txt", "--chrom-hist", "periods")
+
+    assert combined["periods"] == periods
+    # periods lines are '<period>\t<dots>'; every period of the table is shown, not just -x
+    shown = {int(line.split("\t")[0]) for line in periods.splitlines() if "\t" in line}
+    assert shown == {60, 75, 91, 92, 110}
+    # arrays and specific keep the -x filter
+    assert combined["arrays"] == chrom_hist(ultra_tsv, tmp_path / "arrays.txt", "--chrom-hist", "arrays", "-x", "91")
+    assert combined["specific"] == chrom_hist(ultra_tsv, tmp_path / "specific.txt", "--chrom-hist", "specific", "-x", "91")
+
+
+def test_periods_only_ignores_x(ultra_tsv, tmp_path):
+    assert (chrom_hist(ultra_tsv, tmp_path / "x.txt", "--chrom-hist", "periods", "-x", "91")
+            == chrom_hist(ultra_tsv, tmp_path / "no_x.txt", "--chrom-hist", "periods"))